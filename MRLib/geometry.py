@@ -20,8 +20,19 @@ nearest_point
     Finds the nearest point to a given point in a list of points.
         >>> nearest_point((0, 0), [(1, 1), (1, 0), (0, 1)])
         (1, 0)
+segment_circle_crossing
+    Finds where a segment enters a circle, as a fraction of the segment.
+        >>> segment_circle_crossing((0, 0), (4, 0), (3, 0), 1)
+        0.5
+segment_box_crossing
+    Finds where a segment leaves the box [0, width) x [0, height), as a fraction of the segment.
+        >>> segment_box_crossing((1, 1), (5, 1), (3, 3))
+        0.5
 """
 
+import math
+
+import numpy as np
 from numpy import arctan, pi
 
 
@@ -47,4 +58,47 @@ def distance(A: tuple[float, float], B: tuple[float, float]) -> float:
 
 def nearest_point(A: tuple[float, float], points: list[tuple[float, float]]) -> tuple[float, float]:
     distances = [distance(A, point) for point in points]
-    return points[distances.index(min(distances))]
\ No newline at end of file
+    return points[distances.index(min(distances))]
+
+def segment_circle_crossing(A: np.ndarray, B: np.ndarray, center: np.ndarray, radius: np.ndarray) -> np.ndarray:
+    if isinstance(A[0], (int, float)):                                          # Single segment, with plain floats
+        dx, dy, fx, fy = B[0] - A[0], B[1] - A[1], A[0] - center[0], A[1] - center[1]
+        a, b, c = dx*dx + dy*dy, fx*dx + fy*dy, fx*fx + fy*fy - radius*radius
+        if c <= 0:
+            return 0.
+        discriminant = b*b - a*c
+        if a <= 0 or discriminant < 0:
+            return math.nan
+        t = (-b - math.sqrt(discriminant)) / a
+        return t if 0 <= t <= 1 else math.nan
+    A, B, center = np.asarray(A, dtype=float), np.asarray(B, dtype=float), np.asarray(center, dtype=float)
+    d, f = B - A, A - center
+    a = np.sum(d**2, axis=-1)
+    b = np.sum(f * d, axis=-1)
+    c = np.sum(f**2, axis=-1) - np.asarray(radius, dtype=float)**2
+    discriminant = b**2 - a * c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(c <= 0, 0, (-b - np.sqrt(np.maximum(discriminant, 0))) / a)
+    t = np.where((c <= 0) | ((a > 0) & (discriminant >= 0) & (t >= 0) & (t <= 1)), t, np.nan)
+    return float(t) if t.ndim == 0 else t
+
+def segment_box_crossing(A: np.ndarray, B: np.ndarray, size: tuple[float, float]) -> np.ndarray:
+    if isinstance(A[0], (int, float)):                                          # Single segment, with plain floats
+        if 0 <= B[0] < size[0] and 0 <= B[1] < size[1]:
+            return math.nan
+        t = math.inf
+        for k in range(2):
+            d = B[k] - A[k]
+            if d > 0:
+                t = min(t, (size[k] - A[k]) / d)
+            elif d < 0:
+                t = min(t, -A[k] / d)
+        return min(max(t, 0.), 1.)
+    A, B = np.asarray(A, dtype=float), np.asarray(B, dtype=float)
+    d = B - A
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(d > 0, (np.asarray(size, dtype=float) - A) / d, np.where(d < 0, -A / d, np.inf))
+    t = np.min(t, axis=-1)
+    outside = np.any((B < 0) | (B >= np.asarray(size, dtype=float)), axis=-1)
+    t = np.where(outside, np.clip(t, 0, 1), np.nan)
+    return float(t) if t.ndim == 0 else t
@@ -7,12 +7,14 @@ start_time = time.perf_counter()
 
 import numpy as np
 import datetime
+import functools
 import json
 
 import matplotlib.pyplot as plt
 
-from modules.currents import CurrentMap
+from modules.cache import CurrentsCache
 from modules.boats import Boat
+from modules.retention import Retention
 from modules.routes import Route
 from modules import models
 
@@ -39,17 +41,24 @@ end = (155, 45)                                                                #
 # -------------------------------- Currents ---------------------------------- #
 
 currents_max_speed = 2
-currents_dispersion = .3
+currents_dispersion = .3                                                       # Correlation length in meters for spectral currents
 
-currents_models = ["No currents", "Uniform currents", "Random currents"]
+currents_models = ["No currents", "Uniform currents", "Random currents",
+                   "Spectral currents", "Divergence-free spectral currents"]
 # currents_model = mrl.display.menu(currents_models, "Currents model")[0]-1
 currents_model = 2
+currents_seed = 231220                                                         # Same seed, same map
+currents_file = "results/231220 currents.npy"                                  # Precomputed map, generated from the seed if None
+
+currents_cache = CurrentsCache("results/currents_cache",
+                               max_bytes=500*1024**2, max_age=30*24*3600)      # 500 MB, 30 days
 
 # ----------------------------- Boats parameters ----------------------------- #
 
 boats_base_speed = 2 # m/s
 calculations_tick = .1 # s
 precision = .25 # m
+trajectories_spill = None                                                      # Directory of the spilled trajectories, e.g. "results/trajectories", in memory if None
 
 hydrodynamic_efficiency = 1
 # ----------------------------- Prints parameters ---------------------------- #
@@ -71,8 +80,14 @@ adaptedRoute = Route("Route adaptée aux courants", start,
                      models.adaptedRoute, color='#7800CB')
 directRoute = Route("Ligne directe", start,
                     models.directRoute, color='#CB00C7')
+shortestRoute = Route("Plus court chemin", start,
+                      models.shortestRoute, color='#0066CC')
+fastestRoute = Route("Route la plus rapide", start,
+                     functools.partial(models.fastestRoute, base_speed=boats_base_speed,
+                                       hydrodynamic_efficiency=hydrodynamic_efficiency),
+                     color='#E08A00')
 
-routes = [adaptedRoute, directRoute]
+routes = [adaptedRoute, directRoute, shortestRoute, fastestRoute]
 
 # -------------------------------- Print routes ------------------------------ #
 print("----- 🧭 Routes -----")
@@ -82,38 +97,59 @@ for r in routes:
 # ---------------------------------- Boats ----------------------------------- #
 
 inertBoat = Boat("Bateau inerte", start,
-                 boats_base_speed, hydrodynamic_efficiency, calculations_tick=calculations_tick)
+                 boats_base_speed, hydrodynamic_efficiency, calculations_tick=calculations_tick,
+                 retention=Retention(spill=trajectories_spill))
 
 initialHeadedBoat = Boat("Maintien de cap", start,
                          boats_base_speed, hydrodynamic_efficiency,
                          models.directionKeeping, precision=precision, color='#CC2D2D',
                          modelParams={'model': models.directionKeeping},
-                         calculations_tick=calculations_tick)
+                         calculations_tick=calculations_tick,
+                         retention=Retention(spill=trajectories_spill))
 
 GPSheadedBoat = Boat("Guidage GPS", start,
                      boats_base_speed, hydrodynamic_efficiency,
                      models.controlledPositionPICorrector, precision=precision, color='#88BE1B',
-                     calculations_tick=calculations_tick)
+                     calculations_tick=calculations_tick,
+                     retention=Retention(spill=trajectories_spill))
 
 driftCorrectionBoat = Boat("Correction de la dérive", start,
                            boats_base_speed, hydrodynamic_efficiency,
                            models.driftCorrection, precision=precision, color='#941BBE',
-                           calculations_tick=calculations_tick)
+                           calculations_tick=calculations_tick,
+                           retention=Retention(spill=trajectories_spill))
 
 currentsAdaptedBoatPI = Boat("Suivi de la route adaptée", start,
                             boats_base_speed, hydrodynamic_efficiency,
                             models.routeFollowing, precision=precision, color='#72FF70',
                             modelParams={'route': adaptedRoute, 'model': models.controlledPositionPICorrector},
-                            calculations_tick=calculations_tick)
+                            calculations_tick=calculations_tick,
+                            retention=Retention(spill=trajectories_spill))
 
 directRouteBoat = Boat("Suivi de la ligne directe", start,
                           boats_base_speed, hydrodynamic_efficiency,
                           models.routeFollowing, precision=precision, color='#BE1B88',
                           modelParams={'route': directRoute, 'model': models.controlledPositionPICorrector},
-                          calculations_tick=calculations_tick)
+                          calculations_tick=calculations_tick,
+                          retention=Retention(spill=trajectories_spill))
+
+shortestRouteBoat = Boat("Suivi du plus court chemin", start,
+                         boats_base_speed, hydrodynamic_efficiency,
+                         models.routeFollowing, precision=precision, color='#1B6FBE',
+                         modelParams={'route': shortestRoute, 'model': models.controlledPositionPICorrector},
+                         calculations_tick=calculations_tick,
+                         retention=Retention(spill=trajectories_spill))
+
+fastestRouteBoat = Boat("Suivi de la route la plus rapide", start,
+                        boats_base_speed, hydrodynamic_efficiency,
+                        models.routeFollowing, precision=precision, color='#BE7A1B',
+                        modelParams={'route': fastestRoute, 'model': models.controlledPositionPICorrector},
+                        calculations_tick=calculations_tick,
+                        retention=Retention(spill=trajectories_spill))
 
 
-boats = [inertBoat, initialHeadedBoat, GPSheadedBoat, currentsAdaptedBoatPI, directRouteBoat]
+boats = [inertBoat, initialHeadedBoat, GPSheadedBoat, currentsAdaptedBoatPI, directRouteBoat, shortestRouteBoat,
+         fastestRouteBoat]
 
 # -------------------------------- Print boats ------------------------------- #
 
@@ -132,17 +168,12 @@ step_time = time.perf_counter()
 print("▶ Currents")
 print("Generating currents...")
 
-with open(f"results/231220 currents.npy", "rb") as f: #{datetime.datetime.now().strftime('%y%m%d')}
-    currents_map = np.load(f)
-
-currents = CurrentMap(size, currents_model, currents_max_speed,
-                      currents_dispersion, currents_map=currents_map)
+currents = currents_cache.get(size, currents_model, currents_max_speed,
+                              currents_dispersion, seed=currents_seed, source=currents_file)
 currents_map = currents.get_currents()
 currents_speeds = currents.speeds
 
-# with open(f"results/{datetime.datetime.now().strftime('%y%m%d')} currents.npy", "wb") as f:
-#     np.save(f, currents_map)
-
+print(f"✔ Currents cache: {currents_cache.hits} hit(s), {currents_cache.misses} miss(es)")
 print(f"✅ Currents generated in {time.perf_counter()-step_time:.2f}s")
 
 # ---------------------------------------------------------------------------- #
@@ -337,11 +368,11 @@ print("Plotting datas...")
 fig, axs = plt.subplots(4, 1, sharex=True)
 # plt.suptitle("Self steering boat simulation datas")
 
-Mx = calculations_tick * max(len(b.speeds) for b in boats)
+Mx = max(b.time for b in boats)
 
 # ----------------------------------- Speed ---------------------------------- #
 for b in boats:
-    axs[0].plot(np.arange(0,len(b.speeds)*calculations_tick, calculations_tick),
+    axs[0].plot(b.times[1:],
                 b.speeds, color=b.color, label=b.name)
 
 
@@ -359,7 +390,7 @@ print("✔ Speed plotted")
 
 # --------------------------------- Direction -------------------------------- #
 for b in boats:
-    axs[1].plot(np.arange(0,len(b.directions)*calculations_tick, calculations_tick),
+    axs[1].plot(b.times[1:],
                 b.directions*180/np.pi, color=b.color, label=b.name)
 
 
@@ -377,7 +408,7 @@ print("✔ Direction plotted")
 
 # ------------------------------- Currents work ------------------------------ #
 for b in boats:
-    axs[2].plot(np.arange(0,len(b.powers)*calculations_tick, calculations_tick),
+    axs[2].plot(b.times[1:],
                 b.powers, color=b.color, label=b.name)
 
 
@@ -394,21 +425,17 @@ axs[2].set_ylim(m, M)
 print("✔ Currents work plotted")
 
 # ------------------------------ Currents speed ------------------------------ #
-for b in boats:
-    axs[3].plot(np.arange(0,(len(b.speeds)+1)*calculations_tick, calculations_tick),
-                currents_speeds[b.positions[:,1].astype(int), b.positions[:,0].astype(int)],
-                b.color, label=b.name)
+boats_currents_speeds = [currents_speeds[np.minimum(b.positions[:,1].astype(int), size[1]-1),
+                                         np.minimum(b.positions[:,0].astype(int), size[0]-1)]
+                         for b in boats]                                       # Last positions can be on the map's edge
+
+for b, speeds in zip(boats, boats_currents_speeds):
+    axs[3].plot(b.times, speeds, b.color, label=b.name)
 
 
 axs[3].set_ylabel(r"$Currents \ speed \ (m/s)$")
-m, M = int(np.min(np.concatenate([currents_speeds[
-                                                    b.positions[:,1].astype(int),
-                                                    b.positions[:,0].astype(int)
-                                                 ] for b in boats]))-1), \
-    int(np.max(np.concatenate([currents_speeds[
-                                                b.positions[:,1].astype(int),
-                                                b.positions[:,0].astype(int)
-                                              ] for b in boats]))+1)
+m, M = int(np.min(np.concatenate(boats_currents_speeds))-1), \
+    int(np.max(np.concatenate(boats_currents_speeds))+1)
 axs[3].set_yticks(np.arange(-10, 10.1, 1))
 axs[3].set_yticks(np.arange(-10, 10.1, .5), minor=True)
 axs[3].minorticks_on()
@@ -449,8 +476,8 @@ fig, axs = plt.subplots(3, 1, sharex=True)
 # ------------------------------ Time of arrival ----------------------------- #
 for b in boats:
     if b.arrived:
-        print(b.name, calculations_tick * len(b.positions))
-        axs[0].bar(b.name, calculations_tick * len(b.positions),
+        print(b.name, b.time)
+        axs[0].bar(b.name, b.time,
                    color=b.color, label=b.name)
 
 # axs[0].set_ylabel(r"$Arrival \ time\ (s)$")
@@ -463,8 +490,8 @@ print("✔ Time of arrival plotted")
 # ---------------------------- Total negative work --------------------------- #
 for b in boats:
     if b.steering_model != None:
-        print(b.name, np.sum([p for p in b.powers if p<0]))
-        axs[1].bar(b.name, np.abs(np.sum([p for p in b.powers if p<0])),
+        print(b.name, b.negative_work)
+        axs[1].bar(b.name, np.abs(b.negative_work),
                    color=b.color, label=b.name)
 
 # axs[1].set_ylabel(r"$Total \ negative \ work\ (UA)$")
@@ -477,8 +504,8 @@ print("✔ Total work plotted")
 # ----------------------------- Direction changes ---------------------------- #
 for b in boats:
     if b.steering_model != None:
-        print(b.name, np.sum(np.abs(np.diff(b.directions)))*180/np.pi)
-        axs[2].bar(b.name, np.sum(np.abs(np.diff(b.directions)))*180/np.pi,
+        print(b.name, b.direction_changes*180/np.pi)
+        axs[2].bar(b.name, b.direction_changes*180/np.pi,
                    color=b.color, label=b.name)
 
 # axs[2].set_ylabel(r"$\sum \left| d\theta \right| \ (deg)$")
@@ -516,7 +543,7 @@ fig, axs = plt.subplots(1, 1, sharex=True)
 # --------------------------------- Distance --------------------------------- #
 for b in boats:
     if b.steering_model != None:
-        axs.plot(np.arange(0,(len(b.speeds)+1)*calculations_tick, calculations_tick),
+        axs.plot(b.times,
                  np.sqrt((end[0]-b.positions[:,0])**2 + (end[1]-b.positions[:,1])**2),
                  color=b.color, label=b.name)
 
@@ -591,16 +618,7 @@ print("Exporting datas...")
 
 datas = {}
 for b in boats:
-    datas[b.name] = {
-        # 'speed': list(b.speeds),
-        'max_speed': np.max(b.speeds),
-        # 'direction': list(b.directions),
-        'direction_changes': np.sum(np.abs(np.diff(b.directions)))*180/np.pi,
-        # 'power': list(b.powers),
-        'total_negative_work': np.sum([p for p in b.powers if p<0]),
-        # 'currents_speed': list(currents_speeds[b.positions[:,1].astype(int), b.positions[:,0].astype(int)]),
-        'time_of_arrival': len(b.positions)*calculations_tick,
-    }
+    datas[b.name] = b.metrics()
 
 with open(f"results/{datetime.datetime.now().strftime('%y%m%d')} datas.csv", "w") as f:
     f.write(mrl.export.dictToCSV(datas))
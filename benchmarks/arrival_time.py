@@ -0,0 +1,58 @@
+# ---------------------------------------------------------------------------- #
+#                          Arrival time field benchmark                        #
+# ---------------------------------------------------------------------------- #
+
+"""Measure the fast marching solve of modules.arrival as the map grows, and
+its accuracy against the exact arrival times of uniform currents. The cost per
+cell divided by log N stays flat for an O(N log N) solve. Without Numba the
+kernel runs as plain Python and the largest maps are skipped.
+
+Run from the repository root:
+    python -m benchmarks.arrival_time
+"""
+
+import time
+
+import numpy as np
+
+import modules.jit as jit
+from modules import arrival
+from modules.currents import CurrentMap
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+sizes = [(160, 90), (320, 180), (640, 360), (1280, 720), (2560, 1440)]          # (x, y) in meters
+python_max_cells = 300_000                                                     # Larger maps only with Numba
+base_speed = 2
+uniform_currents = (1, .5)                                                     # Accuracy check, in m/s
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+print(f"---- ⏱️  Arrival time fields, Numba {'installed' if jit.numba is not None else 'not installed'} ----")
+
+currents_map = np.broadcast_to(np.array(uniform_currents, dtype=float), (90, 160, 2))
+start = (80, 45)
+times = arrival.arrival_time(currents_map, start, base_speed)
+y, x = np.mgrid[:90, :160]
+px, py = x - start[0], y - start[1]
+squared, along = px**2 + py**2, px * uniform_currents[0] + py * uniform_currents[1]
+with np.errstate(divide='ignore', invalid='ignore'):
+    exact = squared / (along + np.sqrt(along**2 + (base_speed**2 - np.sum(np.square(uniform_currents))) * squared))
+errors = np.abs(times - exact)[squared > 0] / exact[squared > 0]
+print(f"Uniform currents {uniform_currents} m/s: relative error {np.mean(errors):.2%} on average, {np.max(errors):.2%} at most")
+
+print(f"{'map':>9} | {'cells':>7} | {'solve (s)':>9} | {'µs/cell':>7} | {'µs/cell/log2 N':>14}")
+for size in sizes:
+    cells = size[0] * size[1]
+    if jit.numba is None and cells > python_max_cells:
+        continue
+    currents_map = CurrentMap(size, 3, 1.5, size[0]/10, seed=231220).get_currents()
+    arrival.arrival_time(currents_map[:8, :8], (0, 0), base_speed)             # Compilation
+    t = time.perf_counter()
+    arrival.arrival_time(currents_map, (size[0]//32, size[1]//2), base_speed)
+    duration = time.perf_counter() - t
+    print(f"{f'{size[0]}x{size[1]}':>9} | {cells:>7} | {duration:>9.2f} | {duration/cells*1e6:>7.2f} | {duration/cells/np.log2(cells)*1e6:>14.3f}")
@@ -0,0 +1,58 @@
+# ---------------------------------------------------------------------------- #
+#                          Cost-to-go steering benchmark                       #
+# ---------------------------------------------------------------------------- #
+
+"""Steer a fleet of boats to a common goal through strong currents, with the
+controlled position PI corrector and with the cost-to-go model of
+modules.steering: the one-off backward solve, the run, the share of boats
+arriving and their time of arrival. The solve is shared by every boat and run,
+so it is measured apart.
+
+Run from the repository root:
+    python -m benchmarks.cost_to_go
+"""
+
+import time
+
+import numpy as np
+
+from modules.currents import CurrentMap
+from modules.fleet import BoatFleet
+from modules import steering
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+size = (320, 180)                                                               # (x, y) in meters
+boats = [16, 256]
+end = (300, 90)
+base_speed = 2
+max_currents_speed = 1.8                                                        # Close to the base speed, in m/s
+calculations_tick = .5
+max_steps = 2000
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+currents_map = CurrentMap(size, 3, max_currents_speed, size[0]/8, seed=231220).get_currents()
+
+t = time.perf_counter()
+cost_to_go = steering.CostToGo(currents_map)
+cost_to_go.reset(np.zeros((1, 2)), np.array([end], dtype=float))
+solve_time = time.perf_counter() - t
+
+print(f"---- ⏱️  Fleets to a common goal, {max_currents_speed} m/s currents, {base_speed} m/s boats ----")
+print(f"Cost-to-go solve of the {size[0]}x{size[1]} map: {solve_time*1e3:.0f} ms, once per goal")
+print(f"{'boats':>5} | {'model':>29} | {'run (ms)':>8} | {'arrived':>7} | {'mean arrival (s)':>16}")
+for count in boats:
+    starts = np.stack([np.full(count, 10.), np.linspace(5, size[1] - 5, count)], axis=-1)
+    for name, model in (("controlledPositionPICorrector", steering.ControlledPositionPICorrector()), ("CostToGo", cost_to_go)):
+        fleet = BoatFleet(starts, end, base_speed, model=model, calculations_tick=calculations_tick)
+        t = time.perf_counter()
+        fleet.run(currents_map, max_steps)
+        duration = time.perf_counter() - t
+        arrived = fleet.metrics()['arrived']
+        mean_arrival = np.mean(fleet.metrics()['time_of_arrival'][arrived]) if np.any(arrived) else np.nan
+        print(f"{count:>5} | {name:>29} | {duration*1e3:>8.0f} | {np.mean(arrived):>7.0%} | {mean_arrival:>16.1f}")
@@ -0,0 +1,83 @@
+# ---------------------------------------------------------------------------- #
+#                       Random currents generation benchmark                   #
+# ---------------------------------------------------------------------------- #
+
+"""Compare the anti-diagonal RandomCurrents generator with the former cell by
+cell loop, on time and on the statistics of the normalized maps.
+
+Run from the repository root:
+    python -m benchmarks.currents_generation
+"""
+
+import time
+
+import numpy as np
+
+from modules.currents import RandomCurrents
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+sizes = [(40, 22), (160, 90), (400, 225), (1600, 900)]                         # (x, y) in meters
+loop_max_cells = 400*225                                                       # Bigger maps are too slow for the loop
+repeats = 3
+
+max_speed = 2
+dispersion = .3
+
+# ---------------------------------------------------------------------------- #
+#                                Reference loop                                #
+# ---------------------------------------------------------------------------- #
+
+def loop_random_currents(size: tuple, max_speed: float, dispersion: float) -> np.ndarray:
+    """Former RandomCurrents implementation, filled cell by cell"""
+    dispermin = 1 - dispersion
+    dispermax = 1 + dispersion
+    currents_map = np.zeros((size[1],size[0], 2))
+    currents_map[0,:,:] = np.random.uniform(dispermin, dispermax, (size[0],2))
+    currents_map[:,0,:] = np.random.uniform(dispermin, dispermax, (size[1],2))
+
+    for i in range(size[1]-1):
+        for j in range(size[0]-1):
+            currents_map[i+1,j+1,:] = np.average(
+                    [currents_map[i,j,:],
+                     currents_map[i+1,j,:],
+                     currents_map[i,j+1,:]]
+                    * np.random.uniform(dispermin, dispermax, (3,2)))
+
+    return currents_map
+
+def normalized_speeds(currents_map: np.ndarray) -> np.ndarray:
+    """Currents speeds once normalized like CurrentMap does"""
+    speeds = np.sqrt(currents_map[:,:,0]**2 + currents_map[:,:,1]**2)
+    return speeds / np.max(speeds) * max_speed
+
+def timed(generator: callable, size: tuple) -> tuple[float, np.ndarray]:
+    """Best time over the repeats and the last generated map"""
+    best = np.inf
+    for _ in range(repeats):
+        t = time.perf_counter()
+        currents_map = generator(size, max_speed, dispersion)
+        best = min(best, time.perf_counter() - t)
+    return best, currents_map
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+print("---- ⏱️  Random currents generation ----")
+print(f"{'size':>10} | {'loop (s)':>9} | {'wavefront (s)':>13} | {'speed-up':>8} | {'mean / std loop':>15} | {'mean / std wavefront':>20}")
+
+for size in sizes:
+    wavefront_time, wavefront_map = timed(RandomCurrents, size)
+    wavefront_speeds = normalized_speeds(wavefront_map)
+    wavefront_stats = f"{np.mean(wavefront_speeds):.3f} / {np.std(wavefront_speeds):.3f}"
+
+    if size[0] * size[1] <= loop_max_cells:
+        loop_time, loop_map = timed(loop_random_currents, size)
+        loop_speeds = normalized_speeds(loop_map)
+        loop_stats = f"{np.mean(loop_speeds):.3f} / {np.std(loop_speeds):.3f}"
+        print(f"{size[0]:>5}x{size[1]:<4} | {loop_time:>9.3f} | {wavefront_time:>13.3f} | {loop_time/wavefront_time:>7.1f}x | {loop_stats:>15} | {wavefront_stats:>20}")
+    else:
+        print(f"{size[0]:>5}x{size[1]:<4} | {'-':>9} | {wavefront_time:>13.3f} | {'-':>8} | {'-':>15} | {wavefront_stats:>20}")
@@ -0,0 +1,74 @@
+# ---------------------------------------------------------------------------- #
+#                            Time integration benchmark                        #
+# ---------------------------------------------------------------------------- #
+
+"""Compare the accuracy and the number of steps of the fleet's integrators,
+on boats drifting for a fixed duration in bilinearly interpolated spectral
+currents. The reference is RK4 with a tiny tick.
+
+Run from the repository root:
+    python -m benchmarks.integrators
+"""
+
+import time
+
+import numpy as np
+
+from modules.currents import CurrentMap
+from modules.fleet import BoatFleet
+from modules.integrators import Adaptive, integrators
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+size = (160, 90)
+max_speed = 1.5
+correlation_length = 8
+duration = 40                                                                  # Drift duration in seconds
+boats_count = 100
+reference_tick = .005
+
+runs = [                                                                       # (name, integrator, tick)
+    ("euler", "euler", .1),
+    ("euler", "euler", .01),
+    ("rk2", "rk2", 1),
+    ("rk2", "rk2", .1),
+    ("rk4", "rk4", 1),
+    ("rk4", "rk4", 2),
+    ("adaptive", Adaptive(tolerance=1e-3, max_dt=5), 1),
+    ("adaptive", Adaptive(tolerance=1e-5, max_dt=5), 1),
+]
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+currents = CurrentMap(size, 3, max_speed, correlation_length, seed=1).get_currents()
+rng = np.random.default_rng(0)
+starts = np.stack([rng.uniform(40, 120, boats_count), rng.uniform(25, 65, boats_count)], axis=-1)
+
+def drift(integrator: object, tick: float) -> tuple[np.ndarray, int, float]:
+    """Return the drifted positions, the number of steps and the duration of the run"""
+    fleet = BoatFleet(starts, (-1e9, -1e9), 0, model="inert", calculations_tick=tick,
+                      method="bilinear", integrator=integrators[integrator]() if isinstance(integrator, str) else integrator)
+    steps = 0
+    t = time.perf_counter()
+    while fleet.time < duration - 1e-9:
+        remaining = duration - fleet.time
+        if isinstance(fleet.integrator, Adaptive) and fleet.integrator.dt is not None:
+            fleet.integrator.dt = min(fleet.integrator.dt, remaining)           # Land on the duration
+        fleet.calculations_tick = min(tick, remaining)
+        fleet.step(currents)
+        steps += 1
+    return fleet.positions, steps, time.perf_counter() - t
+
+reference, _, _ = drift("rk4", reference_tick)
+
+print(f"---- ⏱️  Drift of {boats_count} boats for {duration} s ----")
+print(f"{'integrator':>10} | {'tick (s)':>8} | {'steps':>6} | {'max error (m)':>13} | {'time (ms)':>9}")
+for name, integrator, tick in runs:
+    positions, steps, elapsed = drift(integrator, tick)
+    error = np.max(np.sqrt(np.sum((positions - reference)**2, axis=1)))
+    tick_ = "adapt." if name == "adaptive" else f"{tick:g}"
+    print(f"{name:>10} | {tick_:>8} | {steps:>6} | {error:>13.2e} | {elapsed*1e3:>9.1f}")
@@ -0,0 +1,66 @@
+# ---------------------------------------------------------------------------- #
+#                               JIT backend benchmark                          #
+# ---------------------------------------------------------------------------- #
+
+"""Compare the numpy and jit backends on the random currents generation and on
+single boat steering loops, and check that they agree. Without Numba, the jit
+backend falls back to numpy and both columns match.
+
+Run from the repository root:
+    python -m benchmarks.jit_backend
+"""
+
+import time
+
+import numpy as np
+
+import modules.jit as jit
+from modules.boats import Boat
+from modules.currents import RandomCurrents
+from modules import models
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+size = (160, 90)
+batch = 20
+start = (5, 45)
+end = (155, 45)
+calculations_tick = .1                                                         # directionKeeping stalls below .05 s
+repeats = 3
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+def best_time(run: callable) -> tuple[float, object]:
+    """Return the best duration of repeated runs, and the last result"""
+    best = np.inf
+    for _ in range(repeats + 1):                                               # The first run compiles the kernels
+        t = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - t)
+    return best, result
+
+def random_currents(backend: str) -> np.ndarray:
+    return RandomCurrents(size, 2, .3, rng=np.random.default_rng(0), batch=batch, backend=backend)
+
+def steer(model: callable, backend: str) -> Boat:
+    boat = Boat("Benchmark", start, 2, 1, model, precision=.25, calculations_tick=calculations_tick, backend=backend)
+    boat.calculate(currents_map, end)
+    return boat
+
+print(f"---- ⏱️  Backends, Numba {'installed' if jit.numba is not None else 'not installed'} ----")
+print(f"{'kernel':>30} | {'numpy (ms)':>10} | {'jit (ms)':>9} | {'max difference':>14}")
+
+numpy_time, numpy_maps = best_time(lambda: random_currents("numpy"))
+jit_time, jit_maps = best_time(lambda: random_currents("auto"))
+print(f"{f'{batch} random currents maps':>30} | {numpy_time*1e3:>10.1f} | {jit_time*1e3:>9.1f} | {np.max(np.abs(numpy_maps - jit_maps)):>14.2e}")
+
+currents_map = numpy_maps[0] * 2 / np.max(np.sqrt(np.sum(numpy_maps[0]**2, axis=-1)))
+for model in (models.directionKeeping, models.controlledPositionPICorrector):
+    numpy_time, numpy_boat = best_time(lambda: steer(model, "numpy"))
+    jit_time, jit_boat = best_time(lambda: steer(model, "auto"))
+    difference = np.max(np.abs(numpy_boat.positions - jit_boat.positions)) if len(numpy_boat.positions) == len(jit_boat.positions) else np.inf
+    print(f"{model.__name__:>30} | {numpy_time*1e3:>10.1f} | {jit_time*1e3:>9.1f} | {difference:>14.2e}")
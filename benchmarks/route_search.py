@@ -0,0 +1,54 @@
+# ---------------------------------------------------------------------------- #
+#                             Route search benchmark                           #
+# ---------------------------------------------------------------------------- #
+
+"""Measure the cost graph construction and the shortest route queries of
+models.shortestRoute as the map grows. Queries run SciPy's compiled Dijkstra's
+algorithm and rebuild the path from its predecessors: the path cost is checked
+against the cost of target.
+
+Run from the repository root:
+    python -m benchmarks.route_search
+"""
+
+import time
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from modules.currents import CurrentMap
+from modules import score
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+sizes = [(160, 90), (320, 180), (640, 360), (1280, 720)]                       # (x, y) in meters
+distance_weight = 1
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+def timed(run: callable) -> tuple[float, object]:
+    """Return the duration of a run, and its result"""
+    t = time.perf_counter()
+    result = run()
+    return time.perf_counter() - t, result
+
+def path_cost(cost_matrix, path: np.ndarray) -> float:
+    return float(np.sum(cost_matrix[path[:-1], path[1:]]))
+
+print(f"---- ⏱️  Shortest route queries, distance weight {distance_weight} ----")
+print(f"{'map':>9} | {'cells':>7} | {'graph (ms)':>10} | {'query (ms)':>10} | {'path cells':>10} | {'cost error':>10}")
+for size in sizes:
+    currents_map = CurrentMap(size, 3, 2, size[0]/16, seed=231220).get_currents()
+    start, end = (size[0]//32, size[1]//2), (size[0] - size[0]//32, size[1]//2)
+    source, target = score.map_coords_to_index([start, end], size)
+
+    graph_time, cost_matrix = timed(lambda: score.create_cost_matrix(currents_map, distance_weight))
+    query_time, path = timed(lambda: score.shortest_path(cost_matrix, source, target))
+    costs = dijkstra(cost_matrix, indices=source)
+
+    error = abs(path_cost(cost_matrix, path) - costs[target])
+    print(f"{f'{size[0]}x{size[1]}':>9} | {size[0]*size[1]:>7} | {graph_time*1e3:>10.1f} | {query_time*1e3:>10.0f} | {len(path):>10} | {error:>10.1e}")
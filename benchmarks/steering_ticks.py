@@ -0,0 +1,85 @@
+# ---------------------------------------------------------------------------- #
+#                        Single boat steering benchmark                        #
+# ---------------------------------------------------------------------------- #
+
+"""Compare the ticks per second of a single boat steered by the controlled
+position PI corrector: with the former per-tick NumPy scalars and 2-element
+arrays, with the plain floats of modules.models, and with the fleet engine.
+
+Run from the repository root:
+    python -m benchmarks.steering_ticks
+"""
+
+import time
+
+import numpy as np
+
+import MRLib as mrl
+from modules.boats import Boat
+from modules.currents import CurrentMap
+from modules import models, steering
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+size = (160, 90)
+start = (5, 45)
+end = (155, 45)
+calculations_tick = .01
+repeats = 3
+
+# ---------------------------------------------------------------------------- #
+#                               Former model                                   #
+# ---------------------------------------------------------------------------- #
+
+def numpyControlledPositionPICorrector(boat: object, currents_map: np.ndarray, goal_pos: tuple[float, float], hydrodynamic_efficiency: float, calculations_tick: float):
+    """Former controlled position PI corrector, with its former recording"""
+    def add(position, heading, dt):
+        boat.add_power(np.dot(currents_map[int(boat.position[1]), int(boat.position[0]), :], np.subtract(position, boat.position)))
+        boat.add_speed(np.sqrt((position[0] - boat.positions[-1][0])**2 + (position[1] - boat.positions[-1][1])**2/dt))
+        boat.add_position(position)
+        boat.add_direction(heading)
+
+    heading = -(np.arctan2(boat.position[0]-goal_pos[0], boat.position[1]-goal_pos[1]) + np.pi/2)
+    precision = boat.precision
+    while (0 < boat.position[0] < currents_map.shape[1] and 0 < boat.position[1] < currents_map.shape[0]
+           and np.sqrt((boat.position[0] - goal_pos[0])**2 + (boat.position[1] - goal_pos[1])**2) > precision):
+        position = np.asarray(boat.position, dtype=float)
+        next_position = position + calculations_tick * currents_map[int(position[1]), int(position[0]), :] * hydrodynamic_efficiency + calculations_tick * boat.base_speed * np.array([np.cos(heading), np.sin(heading)])
+
+        arrival = mrl.geometry.segment_circle_crossing(position[None], next_position[None], np.array([goal_pos]), precision)[0]
+        leaving = mrl.geometry.segment_box_crossing(position[None], next_position[None], (currents_map.shape[1], currents_map.shape[0]))[0]
+        if not np.isnan(arrival) or not np.isnan(leaving):
+            fraction = np.nanmin([arrival, leaving])
+            add(position + fraction * (next_position - position), heading, fraction * calculations_tick)
+            boat.arrived = not np.isnan(arrival)
+            break
+
+        add(next_position, heading, calculations_tick)
+        heading = -(np.arctan2(boat.position[0]-goal_pos[0], boat.position[1]-goal_pos[1]) + np.pi/2)
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+currents_map = CurrentMap(size, 2, 2, .3, seed=231220).get_currents()
+
+runs = {
+    "NumPy scalars": lambda boat: numpyControlledPositionPICorrector(boat, currents_map, end, 1, calculations_tick),
+    "plain floats": lambda boat: models.controlledPositionPICorrector(boat, currents_map, end, 1, calculations_tick),
+    "fleet engine": lambda boat: boat.calculate(currents_map, end),
+}
+
+print(f"---- ⏱️  Single boat, controlled position PI corrector, {calculations_tick} s tick ----")
+print(f"{'path':>14} | {'ticks':>6} | {'ticks/s':>9} | {'end position':>16}")
+for name, run in runs.items():
+    best = np.inf
+    for _ in range(repeats):
+        boat = Boat("Benchmark", start, 2, 1, steering.ControlledPositionPICorrector(),
+                    precision=.25, calculations_tick=calculations_tick)
+        t = time.perf_counter()
+        run(boat)
+        best = min(best, time.perf_counter() - t)
+    ticks = len(boat.positions) - 1
+    print(f"{name:>14} | {ticks:>6} | {ticks/best:>9.0f} | ({boat.position[0]:6.2f}, {boat.position[1]:6.2f})")
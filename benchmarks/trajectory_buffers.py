@@ -0,0 +1,85 @@
+# ---------------------------------------------------------------------------- #
+#                          Trajectory recording benchmark                      #
+# ---------------------------------------------------------------------------- #
+
+"""Compare the per-tick cost of recording a boat's trajectory with np.append,
+which copies the whole history at each tick, and with the Boat buffers, as the
+trajectory grows to 10⁶ steps.
+
+Run from the repository root:
+    python -m benchmarks.trajectory_buffers
+"""
+
+import time
+
+import numpy as np
+
+from modules.boats import Boat
+
+# ---------------------------------------------------------------------------- #
+#                                 Parameters                                   #
+# ---------------------------------------------------------------------------- #
+
+lengths = [10**3, 10**4, 10**5, 10**6]                                         # Trajectory lengths where the per-tick cost is measured
+window = 1000                                                                  # Ticks timed at each length
+append_max_length = 10**5                                                      # np.append is too slow beyond
+
+# ---------------------------------------------------------------------------- #
+#                                   Recorders                                  #
+# ---------------------------------------------------------------------------- #
+
+class AppendRecorder:
+    """Former Boat recording, with np.append"""
+    def __init__(self):
+        self.positions = np.array([(0., 0.)])
+        self.speeds = np.array([])
+        self.directions = np.array([])
+        self.powers = np.array([])
+
+    def add(self, position, speed, direction, power):
+        self.positions = np.append(self.positions, [(position)], axis=0)
+        self.speeds = np.append(self.speeds, [speed])
+        self.directions = np.append(self.directions, [direction])
+        self.powers = np.append(self.powers, [power])
+
+class BufferRecorder:
+    """Boat recording, with its buffers"""
+    def __init__(self):
+        self.boat = Boat("Benchmark", (0., 0.), 2, 1)
+
+    def add(self, position, speed, direction, power):
+        self.boat.add_power(power)
+        self.boat.add_speed(speed)
+        self.boat.add_position(position)
+        self.boat.add_direction(direction)
+
+def per_tick_costs(recorder: object, max_length: int) -> list[float]:
+    """Return the mean cost of a tick, in µs, at each trajectory length"""
+    costs = []
+    position = np.array([1., 1.])
+    n = 0
+    for length in lengths:
+        if length > max_length:
+            break
+        while n < length - window:                                              # Grow the trajectory, untimed
+            recorder.add(position, 1., 0., 0.)
+            n += 1
+        t = time.perf_counter()
+        for _ in range(window):
+            recorder.add(position, 1., 0., 0.)
+        costs.append((time.perf_counter() - t) / window * 1e6)
+        n += window
+    return costs
+
+# ---------------------------------------------------------------------------- #
+#                                   Benchmark                                  #
+# ---------------------------------------------------------------------------- #
+
+append_costs = per_tick_costs(AppendRecorder(), append_max_length)
+buffer_costs = per_tick_costs(BufferRecorder(), lengths[-1])
+
+print("---- ⏱️  Trajectory recording, per tick ----")
+print(f"{'length':>9} | {'np.append (µs)':>14} | {'buffers (µs)':>12}")
+for k, length in enumerate(lengths):
+    append_cost = f"{append_costs[k]:>14.2f}" if k < len(append_costs) else f"{'-':>14}"
+    print(f"{length:>9} | {append_cost} | {buffer_costs[k]:>12.2f}")
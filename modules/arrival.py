@@ -0,0 +1,74 @@
+"""Arrival time fields: time-optimal routes through the currents
+
+The arrival time field gives, at each node of a currents map, the shortest time
+for a boat of a given water speed to get there from a start, heading optimally
+in the currents (Zermelo's navigation problem). It is the solution of the
+anisotropic eikonal equation |∇T|·speed + c·∇T = 1, computed by fast marching:
+nodes are accepted in increasing time order from a heap, in O(N log N), and each
+node is updated from the segments between its accepted neighbors, exactly for
+the local currents (see jit.arrival_time_kernel). It is first order, and the
+8-neighbor update order is only approximately causal where the currents come
+close to the water speed.
+
+The optimal heading is along ∇T, so optimal routes are found by backtracking
+the field from the end, against the ground velocity c + speed·∇T/|∇T|.
+"""
+
+import numpy as np
+
+import modules.jit as jit
+from modules.currents import sample_currents
+
+def arrival_time(currents_map: np.ndarray, start: tuple[float, float], speed: float, hydrodynamic_efficiency: float = 1) -> np.ndarray:
+    """Return the (y, x) arrival times from start in seconds, inf where the currents prevent reaching a node
+    currents_map: (y, x, 2) currents map
+    start: (x, y) in meters, rounded down to a node
+    speed: boat's water speed in m/s
+    hydrodynamic_efficiency: share of the currents carrying the boat (optional)
+    """
+    if not (0 <= start[0] < currents_map.shape[1] and 0 <= start[1] < currents_map.shape[0]):
+        raise ValueError("Start out of the currents map")
+    return jit.arrival_time_kernel(np.ascontiguousarray(currents_map, dtype=float), int(start[0]), int(start[1]), float(speed), float(hydrodynamic_efficiency))
+
+def heading_field(arrival_times: np.ndarray) -> np.ndarray:
+    """Return the (y, x, 2) unit optimal headings, along the arrival times gradient, null where it is not defined
+    arrival_times: (y, x) arrival times, see arrival_time
+    """
+    finite = np.isfinite(arrival_times)
+    times = np.where(finite, arrival_times, np.max(arrival_times[finite]))       # Flat beyond the reachable nodes
+    gradient = np.stack([np.gradient(times, axis=1), np.gradient(times, axis=0)], axis=-1)
+    norms = np.sqrt(np.sum(gradient**2, axis=-1, keepdims=True))
+    return np.divide(gradient, norms, out=np.zeros(gradient.shape), where=norms > 0)
+
+def backtrack(arrival_times: np.ndarray, currents_map: np.ndarray, start: tuple[float, float], end: tuple[float, float], speed: float, hydrodynamic_efficiency: float = 1, step: float = .5) -> np.ndarray:
+    """Return the (n, 2) optimal route from start to end, backtracked from end in steps of a given length
+    arrival_times: (y, x) arrival times from start, see arrival_time
+    currents_map: (y, x, 2) currents map
+    start: (x, y) in meters
+    end: (x, y) in meters
+    speed: boat's water speed in m/s
+    hydrodynamic_efficiency: share of the currents carrying the boat (optional)
+    step: backtracking step in meters (optional)
+    """
+    if not (0 <= end[0] < arrival_times.shape[1] and 0 <= end[1] < arrival_times.shape[0]):
+        raise ValueError("End out of the currents map")
+    if np.isinf(arrival_times[int(end[1]), int(end[0])]):
+        raise ValueError("End not reachable from start")
+    headings = heading_field(arrival_times)
+    start = np.asarray(start, dtype=float)
+    route = [np.asarray(end, dtype=float)]
+    for _ in range(int(4 * np.sum(arrival_times.shape) / step)):               # Bounded, in case of a flat field
+        position = route[-1]
+        if np.sqrt(np.sum((position - start)**2)) <= step:
+            break
+        currents = sample_currents(currents_map, position[None], "bilinear")[0][0]
+        heading = sample_currents(headings, position[None], "bilinear")[0][0]
+        velocity = hydrodynamic_efficiency * currents + speed * heading
+        norm = np.sqrt(np.sum(velocity**2))
+        if norm == 0:
+            raise ValueError("Route from start to end not found, the field is flat")
+        route.append(position - step * velocity / norm)
+    else:
+        raise ValueError("Route from start to end not found")
+    route.append(start)
+    return np.array(route[::-1])
@@ -1,31 +1,85 @@
 """This module contains the boat class, which is used to store the boats' data"""
 
+import math
+
 import numpy as np
 
 from typing import Callable
 
 import modules.models as models
+from modules.steering import SteeringModel
+from modules.fleet import BoatFleet
+from modules.watchdog import Watchdog, ARRIVED
+from modules.retention import Retention, SpillBuffer
+
+class Buffer:
+    """Growable array buffer: appends are amortized O(1), the capacity doubling when full"""
+    def __init__(self, shape: tuple = (), capacity: int = 1024):
+        """shape: shape of each value
+        capacity: initial capacity
+        """
+        self.data = np.empty((capacity,) + shape)
+        self.count = 0
+
+    def append(self, value):
+        """Append a value"""
+        if self.count == len(self.data):
+            self.data = np.concatenate([self.data, np.empty_like(self.data)])   # Double the capacity
+        self.data[self.count] = value
+        self.count += 1
+
+    def extend(self, values: np.ndarray):
+        """Append several values"""
+        count = self.count + len(values)
+        if count > len(self.data):
+            self.data = np.concatenate([self.data, np.empty((max(count, 2*len(self.data)) - len(self.data),) + self.data.shape[1:])])
+        self.data[self.count:count] = values
+        self.count = count
+
+    def array(self) -> np.ndarray:
+        """Return a view on the appended values"""
+        return self.data[:self.count]
+
+    def set(self, values: np.ndarray, capacity: int = 1024):
+        """Replace the appended values, in new storage: arrays returned by array before are left untouched
+        capacity: least capacity of the new storage (optional)
+        """
+        values = np.asarray(values, dtype=float).reshape((-1,) + self.data.shape[1:])
+        self.data = np.empty((max(len(values), capacity),) + self.data.shape[1:])
+        self.data[:len(values)] = values
+        self.count = len(values)
 
 class Boat:
     """Boat class"""
-    def __init__(self, name: str, startPos: tuple[float, float], baseSpeed: float, hydrodynamic_efficiency: float, steeringModel: callable = None, modelParams: dict = None, precision: float = 1, color: str = '#373737', calculations_tick: int = 1):
+    def __init__(self, name: str, startPos: tuple[float, float], baseSpeed: float, hydrodynamic_efficiency: float, steeringModel: callable = None, modelParams: dict = None, precision: float = 1, color: str = '#373737', calculations_tick: int = 1, integrator: str = "euler", currents_method: str = "nearest", watchdog: Watchdog = None, backend: str = "numpy", record: bool = True, retention: Retention = None):
         """Initialize the boat with its starting position and its base speed
         name: boat's name
         xStart: in meters
         yStart: in meters
         baseSpeed: in m/s
         hydrodynamic_efficiency: between 0 and 1
-        steeringModel: steering model (optional)
+        steeringModel: steering model function, or SteeringModel run by the fleet engine (optional)
         modelParams: route following parameters (optional)
         color: boat's color (optional)
         calculations_tick: calculations tick (optional)
+        integrator: integrator of SteeringModel runs, see modules.integrators (optional)
+        currents_method: currents sampling of SteeringModel runs, "nearest" or "bilinear" (optional)
+        watchdog: step and wall-clock budgets and stall detection, none if None (optional)
+        backend: "numpy", "jit" or "auto", see modules.jit (optional)
+        record: keep the positions, speeds, directions and powers of the steps, only the metrics if False (optional)
+        retention: kept steps and their storage, every step in memory if None, see modules.retention (optional)
         """
         self.name = name
         self.position = startPos
-        self.positions = np.array([startPos])
-        self.speeds = np.array([])
-        self.directions = np.array([])
-        self.powers = np.array([])
+        self.retention = Retention() if retention is None else retention
+        self.positions_buffer = self.buffer("positions", (2,))
+        self.times_buffer = self.buffer("times")
+        self.speeds_buffer = self.buffer("speeds")
+        self.directions_buffer = self.buffer("directions")
+        self.powers_buffer = self.buffer("powers")
+        self.positions_buffer.append(startPos)
+        self.times_buffer.append(0)
+        self.retention.reset(startPos)
         self.start_pos = startPos
         self.base_speed = baseSpeed
         self.hydrodynamic_efficiency = hydrodynamic_efficiency
@@ -34,8 +88,72 @@ class Boat:
         self.color = color
         self.model_params = modelParams
         self.calculations_tick = calculations_tick
+        self.integrator = integrator
+        self.currents_method = currents_method
+        self.watchdog = Watchdog() if watchdog is None else watchdog
+        self.backend = backend
+        self.record = record
         self.calculations_duration = 0
+        self.time = 0
         self.arrived = False
+        self.termination = None                                                 # Why the run ended, see modules.watchdog
+        self.reset_metrics()
+
+    def buffer(self, series: str, shape: tuple = ()) -> Buffer:
+        """Return the buffer of a recorded series, spilled to disk if the retention policy does"""
+        if self.retention.spill is None:
+            return Buffer(shape)
+        return SpillBuffer(self.retention.path(f"{self.name} {series}"), shape, self.retention.chunk_size)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """(n+1, 2) positions (x, y) in meters"""
+        self.flush()
+        return self.positions_buffer.array()
+
+    @positions.setter
+    def positions(self, positions: np.ndarray):
+        self.positions_buffer.set(positions)
+
+    @property
+    def times(self) -> np.ndarray:
+        """(n+1,) times of the positions in seconds"""
+        self.flush()
+        return self.times_buffer.array()
+
+    @times.setter
+    def times(self, times: np.ndarray):
+        self.times_buffer.set(times)
+
+    @property
+    def speeds(self) -> np.ndarray:
+        """(n,) speeds in m/s"""
+        self.flush()
+        return self.speeds_buffer.array()
+
+    @speeds.setter
+    def speeds(self, speeds: np.ndarray):
+        self.speeds_buffer.set(speeds)
+
+    @property
+    def directions(self) -> np.ndarray:
+        """(n,) directions in radians"""
+        self.flush()
+        return self.directions_buffer.array()
+
+    @directions.setter
+    def directions(self, directions: np.ndarray):
+        self.directions_buffer.set(directions)
+
+    @property
+    def powers(self) -> np.ndarray:
+        """(n,) currents powers, arbitrary unit"""
+        self.flush()
+        return self.powers_buffer.array()
+
+    @powers.setter
+    def powers(self, powers: np.ndarray):
+        self.powers_buffer.set(powers)
     
     def move(self, speed, direction):
         """"Move the boat with a given speed and direction
@@ -51,46 +169,147 @@ class Boat:
         currents_map: currents map
         end: end point coordinates (x, y) in meters
         """
+        self.watchdog.reset(self.position, None if self.steering_model is None else end)
         if self.steering_model == None:
             models.inert(self, currents_map, self.hydrodynamic_efficiency, self.calculations_tick)
+        elif isinstance(self.steering_model, SteeringModel):
+            BoatFleet.from_boats([self], end, self.steering_model, self.currents_method, self.integrator).run(currents_map)
         else:
             self.steering_model(self, currents_map, end, self.hydrodynamic_efficiency, self.calculations_tick)
+        if self.termination is None and self.arrived:
+            self.termination = ARRIVED
     
     def add_position(self, position: tuple[float, float]):
         """Add a position to the boat's positions
         position: (x, y) in meters"""
-        self.positions = np.append(self.positions, [(position)], axis=0)
+        self.positions_buffer.append(position)
         self.position = position
     
     def add_speed(self, speed: float):
         """Add a speed to the boat's speeds
         speed: in m/s"""
-        self.speeds = np.append(self.speeds, [speed])
+        self.speeds_buffer.append(speed)
     
     def add_direction(self, direction: float):
         """Add a direction to the boat's directions
         direction: in radians
         """
-        self.directions = np.append(self.directions, [direction])
+        self.directions_buffer.append(direction)
     
     def add_power(self, power: float):
         """Add a power to the boat's powers
         power: arbitrary unit"""
-        self.powers = np.append(self.powers, [power])
+        self.powers_buffer.append(power)
 
-    def add(self, position: tuple[float, float], currents_map: np.ndarray, heading: float):
+    def add(self, position: tuple[float, float], currents_map: np.ndarray, heading: float, dt: float = None):
         """Add a position to the boat's positions
-        position: (x, y) in meters"""
-        self.add_power(np.dot(currents_map[int(self.position[1]), int(self.position[0]), :], np.subtract(position, self.position)))
-        self.add_speed(np.sqrt((position[0] - self.positions[-1][0])**2 + (position[1] - self.positions[-1][1])**2/self.calculations_tick))
-        self.add_position(position)
-        self.add_direction(heading)
+        position: (x, y) in meters
+        dt: step duration in seconds, the calculations tick if None (optional)"""
+        dt = self.calculations_tick if dt is None else dt
+        x, y = self.position[0], self.position[1]
+        dx, dy = position[0] - x, position[1] - y
+        iy, ix = int(y), int(x)
+        power = float(currents_map[iy, ix, 0]) * dx + float(currents_map[iy, ix, 1]) * dy
+        speed = math.sqrt(dx**2 + dy**2/dt)
+        self.position = position
+        self.time += dt
+        if self.record:
+            if self.retention.selects:
+                self.store(self.retention.add((position, self.time, speed, heading, power)))
+            else:
+                self.powers_buffer.append(power)
+                self.speeds_buffer.append(speed)
+                self.positions_buffer.append(position)
+                self.times_buffer.append(self.time)
+                self.directions_buffer.append(heading)
+
+        self.steps += 1                                                         # Online metrics
+        self.max_speed = max(self.max_speed, speed)
+        if self.heading is not None:
+            self.direction_changes += abs(heading - self.heading)
+        self.heading = heading
+        if power < 0:
+            self.negative_work += power
+
+    def extend(self, positions: np.ndarray, currents_map: np.ndarray, headings: np.ndarray, dts: np.ndarray):
+        """Add several positions at once, like add
+        positions: (n, 2) positions (x, y) in meters
+        currents_map: currents map
+        headings: (n,) in radians
+        dts: (n,) steps durations in seconds
+        """
+        if len(positions) == 0:
+            return
+        previous = np.concatenate([np.reshape(np.asarray(self.position, dtype=float), (1, 2)), positions[:-1]])
+        displacements = positions - previous
+        currents = np.asarray(currents_map[previous[:,1].astype(int), previous[:,0].astype(int)], dtype=float)
+        powers = currents[:,0] * displacements[:,0] + currents[:,1] * displacements[:,1]
+        speeds = np.sqrt(displacements[:,0]**2 + displacements[:,1]**2/dts)
+        times = self.time + np.cumsum(dts)
+        if self.record:
+            if self.retention.selects:
+                for record in zip(positions, times, speeds, headings, powers):
+                    self.store(self.retention.add(record))
+            else:
+                self.powers_buffer.extend(powers)
+                self.speeds_buffer.extend(speeds)
+                self.positions_buffer.extend(positions)
+                self.times_buffer.extend(times)
+                self.directions_buffer.extend(headings)
+        self.position = (float(positions[-1,0]), float(positions[-1,1]))
+        self.time = float(times[-1])
+
+        self.steps += len(positions)                                            # Online metrics
+        self.max_speed = max(self.max_speed, float(np.max(speeds)))
+        changes = np.abs(np.diff(headings if self.heading is None else np.concatenate([[self.heading], headings])))
+        self.direction_changes += float(np.sum(changes))
+        self.heading = float(headings[-1])
+        self.negative_work += float(np.sum(powers[powers < 0]))
+
+    def store(self, records: list[tuple]):
+        """Append the steps kept by the retention policy
+        records: (position, time, speed, direction, power) steps
+        """
+        for position, time, speed, direction, power in records:
+            self.positions_buffer.append(position)
+            self.times_buffer.append(time)
+            self.speeds_buffer.append(speed)
+            self.directions_buffer.append(direction)
+            self.powers_buffer.append(power)
+
+    def flush(self):
+        """Store the steps held back by the retention policy, before the trajectory is read"""
+        if self.retention.selects:
+            self.store(self.retention.flush())
+
+    def reset_metrics(self):
+        """Reset the online metrics"""
+        self.steps = 0
+        self.max_speed = 0
+        self.direction_changes = 0                                              # Sum of the heading changes, in radians
+        self.negative_work = 0
+        self.heading = None                                                     # Last heading, in radians
+
+    def metrics(self) -> dict:
+        """Return the exported metrics of the last run, accumulated online whether the boat records or not"""
+        return {
+            'max_speed': self.max_speed,
+            'direction_changes': self.direction_changes * 180/np.pi,
+            'total_negative_work': self.negative_work,
+            'time_of_arrival': self.time,
+            'termination': self.termination,
+        }
 
     def reset(self):
         """Reset the boat's data"""
         self.position = self.start_pos
         self.positions = np.array([self.start_pos])
+        self.times = np.array([0])
         self.speeds = np.array([])
         self.directions = np.array([])
         self.powers = np.array([])
-        self.arrived = False
\ No newline at end of file
+        self.time = 0
+        self.arrived = False
+        self.termination = None
+        self.retention.reset(self.start_pos)
+        self.reset_metrics()
@@ -0,0 +1,135 @@
+"""On-disk cache of currents maps, shared between runs and worker processes"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from modules.currents import CurrentMap
+
+class CurrentsCache:
+    """Currents cache class
+
+    Maps are keyed on their generation parameters, written once as .npy files
+    and opened memory-mapped, so that every process reading the same map shares
+    its pages instead of holding a private copy.
+    """
+    def __init__(self, directory: str = "results/currents_cache", max_bytes: int = None, max_age: float = None):
+        """Initialize the cache
+        directory: cache directory
+        max_bytes: total size above which the least recently used maps are evicted (optional)
+        max_age: age in seconds since last use above which maps are evicted (optional)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, size: tuple, model: int, max_speed: float, dispersion: float = None, direction: float = 0, seed: int = None, dtype: type = np.float64, source: str = None) -> str:
+        """Return the cache key of a currents map"""
+        params = {
+            'size': [int(size[0]), int(size[1])],
+            'model': int(model),
+            'max_speed': float(max_speed),
+            'dispersion': None if dispersion is None else float(dispersion),
+            'direction': float(direction),
+            'seed': None if seed is None else int(seed),
+            'dtype': np.dtype(dtype).str,
+        }
+        if source is not None:
+            params['source'] = os.path.abspath(source)
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Return the file path of a cache key"""
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, size: tuple, model: int, max_speed: float, dispersion: float = None, direction: float = 0, seed: int = None, dtype: type = np.float64, source: str = None) -> CurrentMap:
+        """Return the currents map of the given parameters, generating or importing it and storing it on a miss
+        size: (x, y) in meters
+        model: currents model index
+        max_speed: in m/s
+        dispersion: in [0, 1]
+        direction: in radians
+        seed: random seed, maps without a seed nor a source are not reproducible and are never cached
+        dtype: storage type (optional)
+        source: .npy file of a precomputed map, imported and normalized instead of generated (optional)
+        """
+        if seed is None and source is None:
+            return CurrentMap(size, model, max_speed, dispersion, direction=direction, dtype=dtype)
+
+        path = self.path(self.key(size, model, max_speed, dispersion, direction, seed, dtype, source))
+
+        if os.path.exists(path):
+            self.hits += 1
+            os.utime(path)                                                      # Mark as recently used
+        else:
+            self.misses += 1
+            if source is None:
+                currents = CurrentMap(size, model, max_speed, dispersion, direction=direction, seed=seed, dtype=dtype)
+            else:
+                currents = CurrentMap(size, model, max_speed, dispersion, direction=direction,
+                                      currents_map=np.load(source), dtype=dtype)
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "wb") as f:
+                np.save(f, currents.get_currents())
+            os.replace(temporary_path, path)                                    # Atomic, concurrent writers produce the same file
+            self.evict(keep=path)
+
+        return CurrentMap(size, model, max_speed, dispersion, direction=direction, seed=seed,
+                          currents_map=np.load(path, mmap_mode='r'), normalize=False, dtype=dtype)
+
+    def entries(self) -> list[tuple[str, int, float]]:
+        """Return the (path, size in bytes, last use time) of the cached maps, least recently used first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((os.path.join(self.directory, name), stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self) -> int:
+        """Return the total size of the cached maps in bytes"""
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self, max_bytes: int = None, max_age: float = None, keep: str = None) -> int:
+        """Remove maps unused for more than max_age seconds, then the least recently used ones until the cache fits in max_bytes
+        max_bytes: defaults to the cache max_bytes (optional)
+        max_age: defaults to the cache max_age (optional)
+        keep: path never evicted (optional)
+        Return the number of removed maps
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age = self.max_age if max_age is None else max_age
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        now = time.time()
+        removed = 0
+
+        for path, size, last_use in entries:
+            too_old = max_age is not None and now - last_use > max_age
+            too_big = max_bytes is not None and total > max_bytes
+            if path == keep or not (too_old or too_big):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:                                           # Already evicted by another process
+                pass
+            total -= size
+            removed += 1
+
+        return removed
+
+    def clear(self) -> int:
+        """Remove every cached map
+        Return the number of removed maps
+        """
+        return self.evict(max_bytes=0)
+
+    def stats(self) -> dict:
+        """Return the hit and miss counters"""
+        return {'hits': self.hits, 'misses': self.misses}
@@ -3,65 +3,238 @@
 import numpy as np
 import random as rd
 
+from functools import cached_property
+
+import modules.jit as jit
+
 class CurrentMap:
-    """Currents map class"""
-    def __init__(self, size: tuple, model: int, max_speed: float, dispersion: float = None, min_speed: float = 0, direction: float = 0, currents_map: np.ndarray = None):
+    """Currents map class
+
+    Derived fields (speeds, directions, divergence, curl and jacobian) are
+    computed on first access only, in the dtype of the map.
+    """
+    def __init__(self, size: tuple, model: int, max_speed: float, dispersion: float = None, min_speed: float = 0, direction: float = 0, currents_map: np.ndarray = None, seed: int = None, normalize: bool = True, dtype: type = None, backend: str = "numpy"):
+        """Generate the currents map, or wrap a given one
+        size: (x, y) in meters
+        model: currents model index
+        max_speed: in m/s
+        dispersion: in [0, 1], or correlation length in meters for the spectral models
+        direction: in radians
+        currents_map: precomputed (y, x, 2) currents (optional)
+        seed: random seed, for reproducible maps (optional)
+        normalize: scale the map to max_speed, disable for already normalized maps to avoid a copy (optional)
+        dtype: storage type, np.float32 halves the memory, defaults to float64 or to the type of an unnormalized currents_map (optional)
+        backend: "numpy", "jit" or "auto", see modules.jit (optional)
+        """
         self.size = size
         self.model = model
         self.min_speed = min_speed
         self.max_speed = max_speed
         self.dispersion = dispersion
         self.direction = direction
-        self.speeds = np.zeros((size[1],size[0]))
+        self.seed = seed
 
         if currents_map is None:
-            if model == 0:
-                self.map = NoCurrents(self.size)
-            elif model == 1:
-                self.map = UniformCurrents(self.size, self.max_speed, self.direction)
-            elif model == 2:
-                self.map = RandomCurrents(self.size, self.max_speed, self.dispersion, self.direction)
-            else:
-                raise ValueError("Currents model not found")
+            rng = None if seed is None else np.random.default_rng(seed)
+            currents_map = generate_currents(self.size, self.model, self.max_speed, self.dispersion, self.direction, rng, backend=backend)
+
+        if normalize:
+            self.map = normalize_currents(currents_map, self.model, self.max_speed, np.float64 if dtype is None else dtype)
         else:
-            self.map = currents_map
-        
-        self.speeds = np.sqrt(self.map[:,:,0]**2 + self.map[:,:,1]**2)
-        if model != 0:
-            self.map = self.map / np.max(self.speeds) * self.max_speed
-        self.speeds = np.sqrt(self.map[:,:,0]**2 + self.map[:,:,1]**2)
-        
+            self.map = currents_map if dtype is None else currents_map.astype(dtype, copy=False)
+
     def get_currents(self) -> np.ndarray:
         """Return the currents map"""
         return self.map
+
+    @property
+    def shape(self) -> tuple:
+        """(y, x, 2) shape of the currents map"""
+        return self.map.shape
+
+    def __getitem__(self, key):
+        """Index the currents map"""
+        return self.map[key]
     
     def get_speeds(self) -> np.ndarray:
         """Return the currents speeds map"""
         return self.speeds
 
+    @cached_property
+    def speeds(self) -> np.ndarray:
+        """(y, x) currents speeds in m/s"""
+        return currents_speeds(self.map)
+
+    @cached_property
+    def directions(self) -> np.ndarray:
+        """(y, x) currents directions in radians"""
+        return np.arctan2(self.map[:,:,1], self.map[:,:,0])
+
+    @cached_property
+    def jacobian(self) -> np.ndarray:
+        """(y, x, 2, 2) spatial jacobian of the currents, [[du/dx, du/dy], [dv/dx, dv/dy]] in 1/s"""
+        jacobian = np.empty(self.map.shape + (2,), dtype=self.map.dtype)
+        for k in range(2):
+            jacobian[:,:,k,1], jacobian[:,:,k,0] = np.gradient(self.map[:,:,k])
+        return jacobian
+
+    @cached_property
+    def divergence(self) -> np.ndarray:
+        """(y, x) currents divergence du/dx + dv/dy in 1/s"""
+        return self.jacobian[:,:,0,0] + self.jacobian[:,:,1,1]
+
+    @cached_property
+    def curl(self) -> np.ndarray:
+        """(y, x) currents curl dv/dx - du/dy in 1/s"""
+        return self.jacobian[:,:,1,0] - self.jacobian[:,:,0,1]
+
+    def sample(self, positions: np.ndarray, method: str = "nearest", time: float = 0) -> tuple[np.ndarray, np.ndarray]:
+        """Return the currents at the given positions
+        positions: (N, 2) positions (x, y) in meters
+        method: "nearest" for the currents of the cell holding each position, or "bilinear"
+        time: simulated time in seconds, ignored by static maps
+        Return the (N, 2) currents, null out of the map, and the (N,) in-map mask
+        """
+        return sample_currents(self.map, positions, method)
+
+    @staticmethod
+    def generate_batch(size: tuple, model: int, max_speed: float, dispersion: float = None, batch: int = 1, direction: float = 0, rng: np.random.Generator = None, dtype: type = np.float64, backend: str = "numpy") -> tuple[np.ndarray, np.ndarray]:
+        """Generate several normalized currents maps at once
+        size: (x, y) in meters
+        model: currents model index
+        max_speed: in m/s
+        dispersion: in [0, 1]
+        batch: number of maps
+        direction: in radians
+        rng: random generator (optional)
+        dtype: storage type (optional)
+        backend: "numpy", "jit" or "auto", see modules.jit (optional)
+        Return the (batch, y, x, 2) currents maps and their (batch, y, x) speeds
+        """
+        currents_maps = normalize_currents(generate_currents(size, model, max_speed, dispersion, direction, rng, batch, backend),
+                                           model, max_speed, dtype)
+        return currents_maps, currents_speeds(currents_maps)
+
+    @staticmethod
+    def generate_batches(size: tuple, model: int, max_speed: float, dispersion: float = None, count: int = 1, chunk_size: int = None, direction: float = 0, rng: np.random.Generator = None, dtype: type = np.float64, backend: str = "numpy"):
+        """Generate count normalized currents maps, chunk_size maps at a time
+        chunk_size: maps per chunk, all at once if None (optional)
+        Yield the (chunk, y, x, 2) currents maps and their (chunk, y, x) speeds
+        """
+        chunk_size = count if chunk_size is None else chunk_size
+        for k in range(0, count, chunk_size):
+            yield CurrentMap.generate_batch(size, model, max_speed, dispersion, min(chunk_size, count - k), direction, rng, dtype, backend)
+
+# ----------------------------------------------------------- #
+#                    Generation dispatching                   #
+# ----------------------------------------------------------- #
+
+def generate_currents(size: tuple, model: int, max_speed: float, dispersion: float = None, direction: float = 0, rng: np.random.Generator = None, batch: int = None, backend: str = "numpy") -> np.ndarray:
+    """Generate raw currents with the given model
+    size: (x, y) in meters
+    model: currents model index
+    batch: number of maps, a single map if None (optional)
+    backend: "numpy", "jit" or "auto", used by the random currents (optional)
+    """
+    if model == 0:
+        return NoCurrents(size, batch)
+    elif model == 1:
+        return UniformCurrents(size, max_speed, direction, batch)
+    elif model == 2:
+        return RandomCurrents(size, max_speed, dispersion, direction, rng, batch, backend)
+    elif model == 3:
+        return SpectralCurrents(size, max_speed, dispersion, direction, rng, batch)
+    elif model == 4:
+        return SpectralCurrents(size, max_speed, dispersion, direction, rng, batch, divergence_free=True)
+    else:
+        raise ValueError("Currents model not found")
+
+def normalize_currents(currents_map: np.ndarray, model: int, max_speed: float, dtype: type = np.float64) -> np.ndarray:
+    """Scale each map so that its fastest current reaches max_speed
+    currents_map: (..., y, x, 2) currents maps
+    dtype: type of the normalized maps (optional)
+    """
+    if model != 0:
+        scale = max_speed / np.max(currents_speeds(currents_map), axis=(-2, -1))
+        currents_map = currents_map * scale[..., None, None, None]
+    return currents_map.astype(dtype, copy=False)
+
+def currents_speeds(currents_map: np.ndarray) -> np.ndarray:
+    """Return the (..., y, x) speeds of (..., y, x, 2) currents maps"""
+    return np.sqrt(currents_map[...,0]**2 + currents_map[...,1]**2)
+
+# ----------------------------------------------------------- #
+#                          Sampling                           #
+# ----------------------------------------------------------- #
+
+def sample_currents(currents_map: np.ndarray, positions: np.ndarray, method: str = "nearest") -> tuple[np.ndarray, np.ndarray]:
+    """Sample a currents map at many positions at once
+    currents_map: (y, x, 2) currents map
+    positions: (N, 2) positions (x, y) in meters
+    method: "nearest" for the currents of the cell holding each position, like currents_map[int(y), int(x)], or "bilinear" between cell nodes
+    Return the (N, 2) currents, null out of the map, and the (N,) in-map mask
+    """
+    return interpolate_currents(lambda iy, ix: currents_map[iy, ix, :], currents_map.shape, positions, method)
+
+def interpolate_currents(lookup: callable, shape: tuple, positions: np.ndarray, method: str = "nearest") -> tuple[np.ndarray, np.ndarray]:
+    """Sample any currents source at many positions at once
+    lookup: function returning the (N, 2) currents of the (N,) cells indexes (iy, ix)
+    shape: (y, x, 2) shape of the currents source
+    positions: (N, 2) positions (x, y) in meters
+    method: "nearest" or "bilinear", see sample_currents
+    Return the (N, 2) currents, null out of the map, and the (N,) in-map mask
+    """
+    positions = np.asarray(positions, dtype=float)
+    height, width = shape[:2]
+    x, y = positions[...,0], positions[...,1]
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+
+    if method == "nearest":
+        ix = np.clip(x, 0, width-1).astype(int)
+        iy = np.clip(y, 0, height-1).astype(int)
+        currents = lookup(iy, ix)
+    elif method == "bilinear":
+        x, y = np.clip(x, 0, width-1), np.clip(y, 0, height-1)
+        x0 = np.minimum(x.astype(int), max(width-2, 0))                         # Bottom-left node, the last cell is extended to the map edge
+        y0 = np.minimum(y.astype(int), max(height-2, 0))
+        x1, y1 = np.minimum(x0+1, width-1), np.minimum(y0+1, height-1)
+        tx, ty = (x - x0)[..., None], (y - y0)[..., None]
+        currents = ((1-tx) * (1-ty) * lookup(y0, x0) + tx * (1-ty) * lookup(y0, x1)
+                    + (1-tx) * ty * lookup(y1, x0) + tx * ty * lookup(y1, x1))
+    else:
+        raise ValueError("Sampling method not found")
+
+    return np.where(inside[..., None], currents, 0), inside
+
+def _shape(size: tuple, batch: int = None) -> tuple:
+    """Shape of a currents map, or of a batch of them"""
+    return (size[1], size[0], 2) if batch is None else (batch, size[1], size[0], 2)
+
 # ----------------------------------------------------------- #
 #                      Currents model 0                       #
 #                         No currents                         #
 # ----------------------------------------------------------- #
 
-def NoCurrents(size: tuple) -> np.ndarray:
+def NoCurrents(size: tuple, batch: int = None) -> np.ndarray:
     """Generate no currents
     size: (x, y) in meters
+    batch: number of maps (optional)
     """
-    return np.zeros((size[1], size[0], 2))
+    return np.zeros(_shape(size, batch))
 
 # ----------------------------------------------------------- #
 #                      Currents model 1                       #
 #                     Uniform currents                        #
 # ----------------------------------------------------------- #
 
-def UniformCurrents(size: tuple, speed: float, direction: float = 0) -> np.ndarray:
+def UniformCurrents(size: tuple, speed: float, direction: float = 0, batch: int = None) -> np.ndarray:
     """Generate uniform currents
     size: (x, y) in meters
     speed: in m/s
     direction: in radians
+    batch: number of maps (optional)
     """
-    currents = np.zeros((size[1], size[0], 2))
+    currents = np.zeros(_shape(size, batch))
     currents[:,:,:] = speed
     return currents
 
@@ -70,26 +243,92 @@ def UniformCurrents(size: tuple, speed: float, direction: float = 0) -> np.ndarr
 #                  Generate random currents                   #
 # ----------------------------------------------------------- #
 
-def RandomCurrents(size: tuple, max_speed: float, dispersion: float, direction: float = 0) -> np.ndarray:
+def RandomCurrents(size: tuple, max_speed: float, dispersion: float, direction: float = 0, rng: np.random.Generator = None, batch: int = None, backend: str = "numpy") -> np.ndarray:
     """Generate random currents
     size: (x, y) in meters
     max_speed: in m/s
     dispersion: in [0, 1]
     direction: in radians
+    rng: random generator (optional, defaults to numpy's global generator)
+    batch: number of maps, generated together (optional)
+    backend: "numpy", "jit" or "auto", see modules.jit (optional)
+
+    Each cell is the average of the currents at its left, bottom and bottom-left
+    with a random dispersion. A cell only depends on the previous anti-diagonals,
+    so the map is filled one anti-diagonal at a time.
     """
+    rng = np.random if rng is None else rng
     dispermin = 1 - dispersion
     dispermax = 1 + dispersion
-    currents_map = np.zeros((size[1],size[0], 2))
-    currents_map[0,:,:] = np.random.uniform(dispermin, dispermax, (size[0],2))      # Generate currents at the bottom line
-    currents_map[:,0,:] = np.random.uniform(dispermin, dispermax, (size[1],2))      # Generate currents at the left line
-
-
-    for i in range(size[1]-1):                                       # Generate currents - line by line
-        for j in range(size[0]-1):                                   # Generate currents - column by column
-            currents_map[i+1,j+1,:] = np.average(
-                    [currents_map[i,j,:],
-                     currents_map[i+1,j,:],
-                     currents_map[i,j+1,:]] 
-                    * np.random.uniform(dispermin, dispermax, (3,2)))                 # Generate currents - average of the currents at the left, bottom and bottom-left with a random dispersion - X composant
-            
-    return currents_map
\ No newline at end of file
+    batch_shape = () if batch is None else (batch,)
+    currents_map = np.zeros(_shape(size, batch))
+    currents_map[...,0,:,:] = rng.uniform(dispermin, dispermax, batch_shape + (size[0],2))   # Generate currents at the bottom line
+    currents_map[...,:,0,:] = rng.uniform(dispermin, dispermax, batch_shape + (size[1],2))   # Generate currents at the left line
+    factors = rng.uniform(dispermin, dispermax, batch_shape + (size[1]-1, size[0]-1, 3, 2))  # Random dispersion of every cell, drawn at once
+
+    return propagate_random_currents(currents_map, factors, backend)
+
+def propagate_random_currents(currents_map: np.ndarray, factors: np.ndarray, backend: str = "numpy") -> np.ndarray:
+    """Fill a currents map from its bottom line and left line, in place
+    currents_map: (..., y, x, 2) currents with their bottom and left lines set
+    factors: (..., y-1, x-1, 3, 2) random dispersion of the bottom-left, left and bottom currents of each cell
+    backend: "numpy", "jit" or "auto", see modules.jit (optional)
+    """
+    height, width = currents_map.shape[-3:-1]
+
+    if jit.use_jit(backend):                                                        # Cell by cell, in compiled code
+        maps = np.ascontiguousarray(currents_map, dtype=np.float64)                 # Reshaped as a view, so the kernel fills it in place
+        jit.propagate_random_currents_kernel(maps.reshape(-1, height, width, 2),
+                                             np.ascontiguousarray(factors, dtype=np.float64).reshape(-1, height - 1, width - 1, 3, 2))
+        if maps is not currents_map:                                                # Copied: filled back into the given map
+            currents_map[...] = maps
+        return currents_map
+
+    for d in range(2, width + height - 1):                                          # Generate currents - anti-diagonal by anti-diagonal
+        i = np.arange(max(1, d - width + 1), min(height - 1, d - 1) + 1)           # Rows of the anti-diagonal
+        j = d - i                                                                   # Columns of the anti-diagonal
+        f = factors[..., i-1, j-1, :, :]
+        currents_map[..., i, j, :] = np.sum(currents_map[..., i-1, j-1, :] * f[..., 0, :]
+                                            + currents_map[..., i, j-1, :] * f[..., 1, :]
+                                            + currents_map[..., i-1, j, :] * f[..., 2, :],
+                                            axis=-1, keepdims=True) / 6                 # Generate currents - average of the currents at the left, bottom and bottom-left with a random dispersion
+
+    return currents_map
+
+# ----------------------------------------------------------- #
+#                    Currents models 3 & 4                    #
+#                Spectral (correlated) currents               #
+# ----------------------------------------------------------- #
+
+def SpectralCurrents(size: tuple, max_speed: float, correlation_length: float, direction: float = 0, rng: np.random.Generator = None, batch: int = None, divergence_free: bool = False) -> np.ndarray:
+    """Generate spatially correlated random currents by filtering white noise in the Fourier domain
+    size: (x, y) in meters
+    max_speed: in m/s
+    correlation_length: in meters
+    direction: in radians
+    rng: random generator (optional, defaults to numpy's global generator)
+    batch: number of maps, generated together (optional)
+    divergence_free: derive the currents from a random stream function (optional)
+
+    The noise is generated on a grid padded by three correlation lengths, then
+    cropped, so the map does not wrap around like the FFT does.
+    """
+    rng = np.random if rng is None else rng
+    batch_shape = () if batch is None else (batch,)
+    pad = int(np.ceil(3 * correlation_length))
+    height, width = size[1] + pad, size[0] + pad
+
+    fy = np.fft.fftfreq(height)[:, None]
+    fx = np.fft.rfftfreq(width)[None, :]
+    spectrum = np.exp(-.5 * (2*np.pi * correlation_length)**2 * (fx**2 + fy**2))   # Gaussian filter of std correlation_length
+
+    if divergence_free:
+        stream = np.fft.rfft2(rng.standard_normal(batch_shape + (height, width))) * spectrum
+        currents = np.stack([np.fft.irfft2(2j*np.pi * fy * stream, (height, width)),     # u = dpsi/dy
+                             np.fft.irfft2(-2j*np.pi * fx * stream, (height, width))],   # v = -dpsi/dx
+                            axis=-1)
+    else:
+        noise = np.fft.rfft2(rng.standard_normal(batch_shape + (2, height, width))) * spectrum
+        currents = np.moveaxis(np.fft.irfft2(noise, (height, width)), -3, -1)
+
+    return np.ascontiguousarray(currents[..., :size[1], :size[0], :])
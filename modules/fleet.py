@@ -0,0 +1,196 @@
+"""Fleet module: many boats simulated at once, as arrays"""
+
+import numpy as np
+import MRLib as mrl
+
+from modules.currents import sample_currents
+from modules.integrators import Integrator, integrators
+from modules.steering import SteeringModel, models as steering_models
+from modules.watchdog import Watchdog, ARRIVED, OUT_OF_BOUNDS, STALLED
+
+class BoatFleet:
+    """Boat fleet class
+
+    Boats are stored as a structure of arrays, (N,) and (N, 2), and every
+    still active boat is advanced in one vectorized step per tick. The steering
+    model only commands the headings, the fleet owns the integration loop: the
+    headings are held over a step, integrated by the chosen integrator. A boat
+    stops when its step enters the circle of its goal's precision or leaves the
+    map, the step being truncated at the crossing, when it moves less than the
+    model's stall distance in a tick, or when the watchdog stops it. Why each
+    boat stopped is kept in terminations.
+    """
+    def __init__(self, start_positions: np.ndarray, goals: np.ndarray, base_speeds: np.ndarray, hydrodynamic_efficiency: float = 1, model: SteeringModel = "controlledPositionPICorrector", precisions: np.ndarray = 1, calculations_tick: float = 1, method: str = "nearest", record: bool = False, boats: list = None, integrator: Integrator = "euler", watchdog: Watchdog = None):
+        """Initialize the fleet
+        start_positions: (N, 2) starting positions (x, y) in meters
+        goals: (N, 2) or (2,) goal positions (x, y) in meters
+        base_speeds: (N,) or scalar base speeds in m/s
+        hydrodynamic_efficiency: (N,) or scalar, between 0 and 1
+        model: steering model, or name of a steering.models adapter
+        precisions: (N,) or scalar arrival precisions in meters
+        calculations_tick: calculations tick in seconds
+        method: currents sampling method, "nearest" or "bilinear"
+        record: keep the positions of every tick (optional)
+        boats: (N,) Boat objects recording each tick (optional)
+        integrator: integrator, or name of an integrators.integrators class (optional)
+        watchdog: step and wall-clock budgets and stall detection, none if None (optional)
+        """
+        self.positions = np.array(start_positions, dtype=float).reshape(-1, 2)
+        count = len(self.positions)
+        self.start_positions = self.positions.copy()
+        self.goals = np.broadcast_to(np.asarray(goals, dtype=float), (count, 2)).copy()
+        self.base_speeds = np.broadcast_to(np.asarray(base_speeds, dtype=float), (count,)).copy()
+        self.hydrodynamic_efficiency = np.broadcast_to(np.asarray(hydrodynamic_efficiency, dtype=float), (count,)).copy()
+        self.precisions = np.broadcast_to(np.asarray(precisions, dtype=float), (count,)).copy()
+        self.model = steering_models[model]() if isinstance(model, str) else model
+        self.integrator = integrators[integrator]() if isinstance(integrator, str) else integrator
+        self.watchdog = Watchdog() if watchdog is None else watchdog
+        self.boats = boats
+        self.calculations_tick = calculations_tick
+        self.method = method
+        self.record = record
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @classmethod
+    def from_boats(cls, boats: list, end: tuple, model: SteeringModel, method: str = "nearest", integrator: Integrator = "euler") -> 'BoatFleet':
+        """Build a fleet recording into Boat objects, which must share their calculations tick and watchdog
+        boats: Boat objects
+        end: end point coordinates (x, y) in meters
+        model: steering model
+        """
+        return cls([b.position for b in boats], end, [b.base_speed for b in boats],
+                   [b.hydrodynamic_efficiency for b in boats], model, [b.precision for b in boats],
+                   boats[0].calculations_tick, method, boats=boats, integrator=integrator,
+                   watchdog=boats[0].watchdog)
+
+    def reset(self):
+        """Reset the fleet's data"""
+        count = len(self.start_positions)
+        self.positions = self.start_positions.copy()
+        self.model.reset(self.positions.copy(), self.goals)
+        self.integrator.reset()
+        self.watchdog.reset(self.positions, None if self.model.inert else self.goals)
+        self.headings = np.full(count, np.nan)
+        self.arrived = (np.sqrt(np.sum((self.positions - self.goals)**2, axis=1)) <= self.precisions) & (not self.model.inert)   # Inert boats drift past their goal, like models.inert
+        self.active = ~self.arrived
+        self.terminations = np.where(self.arrived, ARRIVED, None).astype(object)
+        self.steps = np.zeros(count, dtype=int)
+        self.times = np.zeros(count)                                            # Elapsed time of each boat, in seconds
+        self.time = 0
+        self.max_speeds = np.zeros(count)
+        self.direction_changes = np.zeros(count)
+        self.negative_work = np.zeros(count)
+        self.history = [self.positions.copy()] if self.record else []
+
+    # ------------------------------ Simulation ------------------------------ #
+
+    def sample(self, currents: object, positions: np.ndarray, time: float = None) -> np.ndarray:
+        """Return the (N, 2) currents at the given positions, from a currents map or any currents source
+        time: in seconds, the fleet's time if None (optional)
+        """
+        if isinstance(currents, np.ndarray):
+            return sample_currents(currents, positions, self.method)[0]
+        return currents.sample(positions, self.method, time=self.time if time is None else time)[0]
+
+    def step(self, currents: object) -> int:
+        """Advance every active boat of one step, of one tick unless the integrator adapts it
+        currents: (y, x, 2) currents map, or currents source with a sample method
+        Return the number of boats still active
+        """
+        boats = np.flatnonzero(self.active)
+        if len(boats) == 0:
+            return 0
+
+        position = self.positions[boats]
+        headings = self.model.heading(boats, position, self.goals[boats])
+        efficiency = self.hydrodynamic_efficiency[boats, None]
+        propulsion = 0 if self.model.inert else self.base_speeds[boats, None] * np.stack([np.cos(headings), np.sin(headings)], axis=-1)
+
+        def velocity(positions: np.ndarray, time: float) -> np.ndarray:
+            return self.sample(currents, positions, time) * efficiency + propulsion
+
+        drift = self.sample(currents, position)
+        next_position, step = self.integrator.step(velocity, position, self.time, self.calculations_tick,
+                                                   drift * efficiency + propulsion)
+
+        height, width = currents.shape[:2]
+        if self.model.inert:
+            arrival = np.full(len(boats), np.nan)
+        else:
+            arrival = mrl.geometry.segment_circle_crossing(position, next_position, self.goals[boats], self.precisions[boats])
+        leaving = mrl.geometry.segment_box_crossing(position, next_position, (width, height))
+        arrived = ~np.isnan(arrival) & ~(leaving < arrival)
+        left = ~arrived & ~np.isnan(leaving)
+        fraction = np.where(arrived, arrival, np.where(left, leaving, 1))          # Steps are truncated at the crossings
+        next_position = np.where((fraction < 1)[:, None], position + fraction[:, None] * (next_position - position), next_position)
+
+        stalled = ~arrived & ~left & (np.sqrt(np.sum((next_position - position)**2, axis=1)) < self.model.stall_distance * step / self.calculations_tick)
+        self.active[boats[arrived | left | stalled]] = False                    # Arriving, leaving or motionless boats stop
+        self.arrived[boats[arrived]] = True
+        self.terminations[boats[arrived]] = ARRIVED
+        self.terminations[boats[left]] = OUT_OF_BOUNDS
+        self.terminations[boats[stalled]] = STALLED
+        keep = ~stalled & (fraction > 0)                                        # Boats that moved, even if they stopped on the way
+        boats, position, next_position, drift, headings = boats[keep], position[keep], next_position[keep], drift[keep], headings[keep]
+        dt = fraction[keep] * step
+
+        displacement = next_position - position
+        work = np.sum(drift * displacement, axis=1)
+        self.negative_work[boats] += np.minimum(work, 0)
+        self.max_speeds[boats] = np.maximum(self.max_speeds[boats], np.sqrt(np.sum(displacement**2, axis=1)) / dt)
+        turned = ~np.isnan(self.headings[boats])
+        self.direction_changes[boats[turned]] += np.abs(headings[turned] - self.headings[boats[turned]])
+        self.headings[boats] = headings
+
+        if self.boats is not None:
+            for k, boat in enumerate(boats):
+                self.boats[boat].add(next_position[k], currents, headings[k], dt[k])
+        self.positions[boats] = next_position
+        self.steps[boats] += 1
+        self.times[boats] += dt
+        self.time += step
+
+        watched = self.active[boats]
+        reasons = self.watchdog.check(boats[watched], next_position[watched])
+        stopped = reasons != None
+        self.active[boats[watched][stopped]] = False
+        self.terminations[boats[watched][stopped]] = reasons[stopped]
+
+        if self.record:
+            moved = np.zeros(len(self), dtype=bool)
+            moved[boats] = True
+            self.history.append(np.where(moved[:, None], self.positions, np.nan))
+        return int(np.count_nonzero(self.active))
+
+    def run(self, currents: object, max_steps: int = None) -> int:
+        """Advance the fleet until every boat has stopped
+        currents: (y, x, 2) currents map, or currents source with a sample method
+        max_steps: maximum number of ticks (optional)
+        Return the number of boats still active
+        """
+        steps = 0
+        while (max_steps is None or steps < max_steps) and self.step(currents):
+            steps += 1
+        if self.boats is not None:
+            for k, boat in enumerate(self.boats):
+                boat.arrived = bool(self.arrived[k])
+                boat.termination = self.terminations[k]
+        return int(np.count_nonzero(self.active))
+
+    def trajectories(self) -> np.ndarray:
+        """Return the (T+1, N, 2) recorded positions, NaN once a boat has stopped"""
+        return np.array(self.history)
+
+    def metrics(self) -> dict:
+        """Return the (N,) arrays of the exported metrics"""
+        return {
+            'max_speed': self.max_speeds,
+            'direction_changes': self.direction_changes * 180/np.pi,
+            'total_negative_work': self.negative_work,
+            'time_of_arrival': self.times,
+            'arrived': self.arrived,
+            'termination': self.terminations,
+        }
@@ -0,0 +1,125 @@
+"""Importer of external gridded currents datasets, streamed chunk by chunk"""
+
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+from modules.currents import CurrentMap
+from modules.tiles import TiledCurrentMap
+
+# ---------------------------------------------------------------------------- #
+#                                    Sources                                   #
+# ---------------------------------------------------------------------------- #
+
+def open_source(path: str, source_size: tuple = None, fmt: str = None, dtype: type = np.float64, skip_header: int = 0, chunk_rows: int = 256, staged_path: str = None) -> np.ndarray:
+    """Open a gridded currents file as a (y, x, 2) memory-mapped array
+    path: file path
+    source_size: (x, y) grid size, required by raw and CSV files (optional)
+    fmt: "raw", "npy" or "csv", guessed from the file extension if None (optional)
+    dtype: values type of raw files (optional)
+    skip_header: header lines of CSV files (optional)
+    chunk_rows: grid rows read at once from CSV files (optional)
+    staged_path: .npy file CSV files are staged into, in the temporary directory if None (optional)
+
+    Raw files hold the (y, x, 2) values in row-major order. CSV files hold one
+    cell per line in the same order, the last two columns being the currents
+    components, so leading x and y columns are ignored. CSV files are staged
+    into a .npy file, chunk by chunk.
+    """
+    fmt = os.path.splitext(path)[1][1:].lower() if fmt is None else fmt
+
+    if fmt == "npy":
+        return np.load(path, mmap_mode='r')
+    elif fmt in ("raw", "bin", "dat"):
+        return np.memmap(path, dtype=dtype, mode='r', shape=(source_size[1], source_size[0], 2))
+    elif fmt == "csv":
+        if staged_path is None:
+            file, staged_path = tempfile.mkstemp(suffix=".npy")
+            os.close(file)
+        staged = np.lib.format.open_memmap(staged_path, mode='w+', dtype=np.float64,
+                                           shape=(source_size[1], source_size[0], 2))
+        with open(path, "r") as f:
+            lines = itertools.islice(f, skip_header, None)
+            for row in range(0, source_size[1], chunk_rows):
+                rows = min(chunk_rows, source_size[1] - row)
+                chunk = np.loadtxt(itertools.islice(lines, rows * source_size[0]), delimiter=",", ndmin=2)
+                staged[row:row+rows] = chunk[:, -2:].reshape(rows, source_size[0], 2)
+        staged.flush()
+        del staged
+        return np.load(staged_path, mmap_mode='r')
+    else:
+        raise ValueError("Currents file format not found")
+
+# ---------------------------------------------------------------------------- #
+#                                   Importers                                  #
+# ---------------------------------------------------------------------------- #
+
+def import_currents(path: str, size: tuple, output: str, max_speed: float = None, source_size: tuple = None, fmt: str = None, dtype: type = np.float64, skip_header: int = 0, chunk_rows: int = 256, model: int = 2) -> CurrentMap:
+    """Resample a gridded currents file to the simulation grid, into a memory-mapped .npy file
+    path: source file path, see open_source
+    size: (x, y) simulation grid size in meters
+    output: resampled .npy file path
+    max_speed: in m/s, scale the fastest current to it, keep the file speeds if None (optional)
+    source_size: (x, y) source grid size, required by raw and CSV files (optional)
+    fmt: "raw", "npy" or "csv" (optional)
+    dtype: values type of raw files, and of the output (optional)
+    skip_header: header lines of CSV files (optional)
+    chunk_rows: source grid rows read at once, and largest number of grid rows written at once (optional)
+    model: currents model index reported by the map (optional)
+
+    The source is bilinearly resampled, both grids spanning the same area, a
+    block of source rows at a time: neither file is ever loaded whole, however
+    the grid sizes compare. CSV files are staged next to output, and removed.
+    """
+    staged_path = f"{os.path.splitext(output)[0]} staged.npy"
+    source = open_source(path, source_size, fmt, dtype, skip_header, chunk_rows, staged_path)
+    source_height, source_width = source.shape[:2]
+    currents = np.lib.format.open_memmap(output, mode='w+', dtype=dtype, shape=(size[1], size[0], 2))
+
+    x = np.clip((np.arange(size[0]) + .5) * source_width / size[0] - .5, 0, source_width - 1)   # Cell centers in source coordinates
+    x0 = x.astype(int)
+    x1 = np.minimum(x0 + 1, source_width - 1)
+    tx = (x - x0)[None, :, None]
+
+    y = np.clip((np.arange(size[1]) + .5) * source_height / size[1] - .5, 0, source_height - 1)
+    y0 = y.astype(int)
+    y1 = np.minimum(y0 + 1, source_height - 1)
+    ty = (y - y0)[:, None, None]
+
+    fastest = 0
+    for start in range(0, source_height, chunk_rows):                          # Blocks of source rows, and the next row
+        block = np.asarray(source[start:start+chunk_rows+1], dtype=np.float64)
+        covered = np.flatnonzero((y0 >= start) & (y0 < start + chunk_rows))    # Output rows interpolated from this block
+        for rows in np.array_split(covered, -(-len(covered) // chunk_rows)) if len(covered) else []:
+            b0, b1 = y0[rows] - start, y1[rows] - start
+            chunk = ((1-ty[rows]) * ((1-tx) * block[b0][:, x0] + tx * block[b0][:, x1])
+                     + ty[rows] * ((1-tx) * block[b1][:, x0] + tx * block[b1][:, x1]))
+            currents[rows[0]:rows[-1]+1] = chunk
+            fastest = max(fastest, np.max(np.sqrt(chunk[:,:,0]**2 + chunk[:,:,1]**2)))
+
+    if max_speed is not None and fastest > 0:                                   # Normalize in place, chunk by chunk
+        for row in range(0, size[1], chunk_rows):
+            currents[row:row+chunk_rows] *= max_speed / fastest
+    currents.flush()
+    del currents, source
+    if os.path.exists(staged_path):
+        os.remove(staged_path)
+
+    return CurrentMap(size, model, fastest if max_speed is None else max_speed,
+                      currents_map=np.load(output, mmap_mode='r'), normalize=False)
+
+def import_tiled_currents(path: str, size: tuple, output: str, max_speed: float = None, tile_size: int = 256, max_tiles: int = 64, **kwargs) -> TiledCurrentMap:
+    """Resample a gridded currents file like import_currents, and serve it tile by tile
+    tile_size: tiles side in meters
+    max_tiles: number of tiles kept in memory
+    kwargs: see import_currents
+    """
+    imported = import_currents(path, size, output, max_speed, **kwargs)
+    currents = imported.get_currents()
+
+    def loader(tile_x: int, tile_y: int) -> np.ndarray:
+        return np.array(currents[tile_y*tile_size:(tile_y+1)*tile_size, tile_x*tile_size:(tile_x+1)*tile_size])
+
+    return TiledCurrentMap(size, imported.max_speed, tile_size=tile_size, max_tiles=max_tiles, loader=loader)
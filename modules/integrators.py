@@ -0,0 +1,94 @@
+"""Time integrators of the boats' motion, used by the fleet engine
+
+The commanded heading is held over a step, so the velocity only varies with
+the currents met along it: velocity(positions, time) -> (n, 2) in m/s.
+"""
+
+import abc
+
+import numpy as np
+
+class Integrator(abc.ABC):
+    """Integrator class"""
+    def reset(self):
+        """Reset the integrator's state before a run"""
+        pass
+
+    @abc.abstractmethod
+    def step(self, velocity: callable, positions: np.ndarray, time: float, dt: float, k1: np.ndarray = None) -> tuple[np.ndarray, float]:
+        """Advance positions of one step
+        velocity: function of the (n, 2) positions and the time, returning (n, 2) velocities in m/s
+        positions: (n, 2) positions (x, y) in meters
+        time: in seconds
+        dt: proposed step in seconds
+        k1: velocities at positions and time, if already known (optional)
+        Return the (n, 2) next positions and the step actually taken
+        """
+
+class Euler(Integrator):
+    """Explicit Euler, first order"""
+    def step(self, velocity, positions, time, dt, k1=None):
+        k1 = velocity(positions, time) if k1 is None else k1
+        return positions + dt * k1, dt
+
+class RK2(Integrator):
+    """Explicit midpoint, second order"""
+    def step(self, velocity, positions, time, dt, k1=None):
+        k1 = velocity(positions, time) if k1 is None else k1
+        k2 = velocity(positions + dt/2 * k1, time + dt/2)
+        return positions + dt * k2, dt
+
+class RK4(Integrator):
+    """Classic Runge-Kutta, fourth order"""
+    def step(self, velocity, positions, time, dt, k1=None):
+        k1 = velocity(positions, time) if k1 is None else k1
+        k2 = velocity(positions + dt/2 * k1, time + dt/2)
+        k3 = velocity(positions + dt/2 * k2, time + dt/2)
+        k4 = velocity(positions + dt * k3, time + dt)
+        return positions + dt/6 * (k1 + 2*k2 + 2*k3 + k4), dt
+
+class Adaptive(Integrator):
+    """Bogacki-Shampine 3(2) with step size control
+
+    The step shrinks where the currents vary quickly along the trajectories and
+    grows in calm water. Steps are shared by the boats advanced together, so the
+    error is controlled on the worst of them.
+    """
+    def __init__(self, tolerance: float = 1e-3, min_dt: float = 1e-3, max_dt: float = None):
+        """tolerance: local position error per step in meters
+        min_dt: smallest step in seconds
+        max_dt: largest step in seconds, ten proposed steps if None (optional)
+        """
+        self.tolerance = tolerance
+        self.min_dt = min_dt
+        self.max_dt = max_dt
+        self.reset()
+
+    def reset(self):
+        self.dt = None                                                          # Next proposed step
+        self.rejected = 0
+
+    def step(self, velocity, positions, time, dt, k1=None):
+        max_dt = 10 * dt if self.max_dt is None else self.max_dt
+        dt = dt if self.dt is None else self.dt
+        k1 = velocity(positions, time) if k1 is None else k1
+        while True:
+            k2 = velocity(positions + dt/2 * k1, time + dt/2)
+            k3 = velocity(positions + 3*dt/4 * k2, time + 3*dt/4)
+            next_positions = positions + dt * (2/9 * k1 + 1/3 * k2 + 4/9 * k3)
+            k4 = velocity(next_positions, time + dt)
+            error = dt * np.max(np.abs(-5/72 * k1 + 1/12 * k2 + 1/9 * k3 - 1/8 * k4), initial=0)   # Third minus second order solution
+
+            factor = .9 * (self.tolerance / error)**(1/3) if error > 0 else 5
+            if error <= self.tolerance or dt <= self.min_dt:
+                self.dt = min(max(dt * min(factor, 5), self.min_dt), max_dt)
+                return next_positions, dt
+            self.rejected += 1
+            dt = max(dt * max(factor, .2), self.min_dt)
+
+integrators = {
+    'euler': Euler,
+    'rk2': RK2,
+    'rk4': RK4,
+    'adaptive': Adaptive,
+}
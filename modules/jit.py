@@ -0,0 +1,283 @@
+"""Optional JIT backend: the hot loops as scalar kernels, compiled with Numba when it is installed
+
+Runs select their backend: "numpy" for the reference implementations, "jit"
+for these kernels, or "auto" for "jit" when Numba is installed. Without Numba,
+"jit" falls back to "numpy" with a warning.
+"""
+
+import heapq
+import math
+import warnings
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+def njit(function: callable) -> callable:
+    """Compile a function in nopython mode when Numba is installed, keep it as is otherwise"""
+    if numba is None:
+        return function
+    return numba.njit(cache=True)(function)
+
+def use_jit(backend: str) -> bool:
+    """Tell whether a run uses the compiled kernels
+    backend: "numpy", "jit" or "auto"
+    """
+    if backend == "numpy":
+        return False
+    elif backend == "auto":
+        return numba is not None
+    elif backend == "jit":
+        if numba is None:
+            warnings.warn("Numba is not installed, the numpy backend is used instead of jit.")
+        return numba is not None
+    else:
+        raise ValueError("Backend not found")
+
+# ---------------------------------------------------------------------------- #
+#                                Random currents                               #
+# ---------------------------------------------------------------------------- #
+
+@njit
+def propagate_random_currents_kernel(currents_map: np.ndarray, factors: np.ndarray):
+    """Fill (B, y, x, 2) currents maps from their bottom and left lines, in place, see currents.propagate_random_currents"""
+    for b in range(currents_map.shape[0]):
+        for i in range(1, currents_map.shape[1]):
+            for j in range(1, currents_map.shape[2]):
+                total = 0.
+                for k in range(2):
+                    total += (currents_map[b, i-1, j-1, k] * factors[b, i-1, j-1, 0, k]
+                              + currents_map[b, i, j-1, k] * factors[b, i-1, j-1, 1, k]
+                              + currents_map[b, i-1, j, k] * factors[b, i-1, j-1, 2, k])
+                currents_map[b, i, j, 0] = total / 6
+                currents_map[b, i, j, 1] = total / 6
+
+# ---------------------------------------------------------------------------- #
+#                                 Boats loops                                  #
+# ---------------------------------------------------------------------------- #
+
+# Kernels run at most a chunk of steps, so that the watchdog can be consulted
+# between chunks, and return why they stopped.
+ENDED, ARRIVED, OUT_OF_BOUNDS, STALLED, CHUNK = 0, 1, 2, 3, 4
+
+@njit
+def truncate_step_kernel(x: float, y: float, next_x: float, next_y: float, width: int, height: int, arrival: bool, goal_x: float, goal_y: float, precision: float) -> tuple:
+    """Truncate a step where it enters the goal's circle or leaves the map, see models.truncate_step"""
+    t_arrival = math.nan
+    if arrival:
+        dx, dy, fx, fy = next_x - x, next_y - y, x - goal_x, y - goal_y
+        a, b, c = dx*dx + dy*dy, fx*dx + fy*dy, fx*fx + fy*fy - precision*precision
+        if c <= 0:
+            t_arrival = 0.
+        elif a > 0 and b*b - a*c >= 0:
+            t = (-b - math.sqrt(b*b - a*c)) / a
+            if 0 <= t <= 1:
+                t_arrival = t
+    t_leaving = math.nan
+    if not (0 <= next_x < width and 0 <= next_y < height):
+        t_leaving = math.inf
+        dx, dy = next_x - x, next_y - y
+        if dx > 0:
+            t_leaving = min(t_leaving, (width - x) / dx)
+        elif dx < 0:
+            t_leaving = min(t_leaving, -x / dx)
+        if dy > 0:
+            t_leaving = min(t_leaving, (height - y) / dy)
+        elif dy < 0:
+            t_leaving = min(t_leaving, -y / dy)
+        t_leaving = min(max(t_leaving, 0.), 1.)
+
+    arrived = t_arrival == t_arrival and not t_leaving < t_arrival
+    left = not arrived and t_leaving == t_leaving
+    if not (arrived or left):
+        return next_x, next_y, 1., False, False
+    fraction = t_arrival if arrived else t_leaving
+    return x + fraction * (next_x - x), y + fraction * (next_y - y), fraction, arrived, left
+
+@njit
+def inert_kernel(currents_map: np.ndarray, x: float, y: float, efficiency: float, tick: float, steps: int) -> tuple:
+    """Inert boat loop, see models.inert
+    Return the (n, 2) positions, (n,) headings and (n,) durations of the steps, and why the loop stopped
+    """
+    height, width = currents_map.shape[0], currents_map.shape[1]
+    positions, headings, dts = np.empty((steps + 1, 2)), np.zeros(steps + 1), np.empty(steps + 1)
+    n = 0
+    while True:
+        if n == steps:
+            return positions[:n], headings[:n], dts[:n], CHUNK
+        if not (0 <= x < width and 0 <= y < height):
+            return positions[:n], headings[:n], dts[:n], OUT_OF_BOUNDS
+        iy, ix = int(y), int(x)
+        next_x = x + tick * float(currents_map[iy, ix, 0]) * efficiency
+        next_y = y + tick * float(currents_map[iy, ix, 1]) * efficiency
+
+        next_x, next_y, fraction, arrived, left = truncate_step_kernel(x, y, next_x, next_y, width, height, False, 0., 0., 0.)
+        if left:
+            if fraction > 0:
+                positions[n, 0], positions[n, 1], dts[n] = next_x, next_y, fraction * tick
+                n += 1
+            return positions[:n], headings[:n], dts[:n], OUT_OF_BOUNDS
+
+        if x == next_x and y == next_y:
+            return positions[:n], headings[:n], dts[:n], STALLED
+
+        positions[n, 0], positions[n, 1], dts[n] = next_x, next_y, tick
+        n += 1
+        x, y = next_x, next_y
+
+@njit
+def direction_keeping_kernel(currents_map: np.ndarray, x: float, y: float, heading: float, end_x: float, end_y: float, base_speed: float, efficiency: float, tick: float, precision: float, steps: int) -> tuple:
+    """Initial headed boat loop, see models.directionKeeping"""
+    height, width = currents_map.shape[0], currents_map.shape[1]
+    positions, headings, dts = np.empty((steps + 1, 2)), np.full(steps + 1, heading), np.empty(steps + 1)
+    propulsion_x, propulsion_y = tick * base_speed * math.cos(heading), tick * base_speed * math.sin(heading)
+    n = 0
+    while True:
+        if n == steps:
+            return positions[:n], headings[:n], dts[:n], CHUNK
+        if not (0 <= x < width and 0 <= y < height):
+            return positions[:n], headings[:n], dts[:n], OUT_OF_BOUNDS
+        if math.sqrt((x - end_x)**2 + (y - end_y)**2) <= precision:
+            return positions[:n], headings[:n], dts[:n], ENDED
+        iy, ix = int(y), int(x)
+        next_x = x + tick * float(currents_map[iy, ix, 0]) * efficiency + propulsion_x
+        next_y = y + tick * float(currents_map[iy, ix, 1]) * efficiency + propulsion_y
+
+        next_x, next_y, fraction, arrived, left = truncate_step_kernel(x, y, next_x, next_y, width, height, True, end_x, end_y, precision)
+        if arrived or left:
+            if fraction > 0:
+                positions[n, 0], positions[n, 1], dts[n] = next_x, next_y, fraction * tick
+                n += 1
+            return positions[:n], headings[:n], dts[:n], ARRIVED if arrived else OUT_OF_BOUNDS
+
+        if math.sqrt((next_x - x)**2 + (next_y - y)**2) < .1:
+            return positions[:n], headings[:n], dts[:n], STALLED
+
+        positions[n, 0], positions[n, 1], dts[n] = next_x, next_y, tick
+        n += 1
+        x, y = next_x, next_y
+
+@njit
+def controlled_position_kernel(currents_map: np.ndarray, x: float, y: float, goal_x: float, goal_y: float, end_x: float, end_y: float, can_pass: bool, last: bool, base_speed: float, efficiency: float, tick: float, precision: float, steps: int) -> tuple:
+    """Controlled position PI corrector loop, see models.controlledPositionPICorrector"""
+    height, width = currents_map.shape[0], currents_map.shape[1]
+    positions, headings, dts = np.empty((steps + 1, 2)), np.empty(steps + 1), np.empty(steps + 1)
+    n = 0
+    while True:
+        if n == steps:
+            return positions[:n], headings[:n], dts[:n], CHUNK
+        if not (0 <= x < width and 0 <= y < height):
+            return positions[:n], headings[:n], dts[:n], OUT_OF_BOUNDS
+        if math.sqrt((x - goal_x)**2 + (y - goal_y)**2) <= precision:
+            return positions[:n], headings[:n], dts[:n], ENDED
+        heading = -(math.atan2(x - goal_x, y - goal_y) + math.pi/2)
+        iy, ix = int(y), int(x)
+        next_x = x + tick * float(currents_map[iy, ix, 0]) * efficiency + tick * base_speed * math.cos(heading)
+        next_y = y + tick * float(currents_map[iy, ix, 1]) * efficiency + tick * base_speed * math.sin(heading)
+
+        if can_pass and (abs(heading + math.atan2(x - end_x, y - end_y) + math.pi/2) > math.pi/4) and not last:
+            return positions[:n], headings[:n], dts[:n], ENDED
+
+        next_x, next_y, fraction, arrived, left = truncate_step_kernel(x, y, next_x, next_y, width, height,
+                                                                       not can_pass or last, goal_x, goal_y, precision)
+        if arrived or left:
+            if fraction > 0:
+                positions[n, 0], positions[n, 1], headings[n], dts[n] = next_x, next_y, heading, fraction * tick
+                n += 1
+            return positions[:n], headings[:n], dts[:n], ARRIVED if arrived else OUT_OF_BOUNDS
+
+        positions[n, 0], positions[n, 1], headings[n], dts[n] = next_x, next_y, heading, tick
+        n += 1
+        x, y = next_x, next_y
+
+# ---------------------------------------------------------------------------- #
+#                                 Arrival time                                 #
+# ---------------------------------------------------------------------------- #
+
+RING = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))            # (dx, dy) neighbors, turning around a node
+
+@njit
+def travel_time(px: float, py: float, cx: float, cy: float, speed: float) -> float:
+    """Return the time to move by (px, py) at a water speed in the currents (cx, cy), heading optimally, inf if the currents prevent it"""
+    squared = px*px + py*py
+    if squared == 0:
+        return 0.
+    along = px*cx + py*cy
+    discriminant = along*along + (speed*speed - cx*cx - cy*cy) * squared
+    if discriminant < 0:
+        return math.inf
+    denominator = along + math.sqrt(discriminant)
+    if denominator <= 0:
+        return math.inf
+    return squared / denominator
+
+@njit
+def triangle_update(px: float, py: float, ex: float, ey: float, t1: float, t2: float, cx: float, cy: float, speed: float) -> float:
+    """Return the lowest arrival time at a node reached from a point of the segment between two accepted nodes
+    px, py: node minus the second accepted node
+    ex, ey: first minus second accepted node
+    t1, t2: arrival times of the accepted nodes
+    """
+    best = min(t2 + travel_time(px, py, cx, cy, speed), t1 + travel_time(px - ex, py - ey, cx, cy, speed))
+    slack = speed*speed - cx*cx - cy*cy
+    if slack > 0:                                                              # Randers metric, closed-form optimum along the segment
+        along = ex*cx + ey*cy
+        a = slack * (ex*ex + ey*ey) + along * along
+        b = slack * (ex*px + ey*py) + along * (px*cx + py*cy)
+        k = slack * (px*px + py*py) + (px*cx + py*cy)**2
+        slope = t1 - t2 + along / slack
+        g = slope * slope * slack * slack
+        qa, qb, qc = a * (a - g), -2 * b * (a - g), b*b - g * k
+        r0, r1 = -1., -1.
+        if qa != 0 and qb*qb - 4*qa*qc >= 0:
+            root = math.sqrt(qb*qb - 4*qa*qc)
+            r0, r1 = (-qb - root) / (2*qa), (-qb + root) / (2*qa)
+        elif qa == 0 and qb != 0:
+            r0 = -qc / qb
+        for theta in (r0, r1):
+            if 0 < theta < 1:
+                best = min(best, theta * t1 + (1 - theta) * t2 + travel_time(px - theta * ex, py - theta * ey, cx, cy, speed))
+    else:                                                                      # The currents exceed the speed, sampled segment
+        for i in range(1, 8):
+            theta = i / 8
+            best = min(best, theta * t1 + (1 - theta) * t2 + travel_time(px - theta * ex, py - theta * ey, cx, cy, speed))
+    return best
+
+@njit
+def arrival_time_kernel(currents_map: np.ndarray, source_x: int, source_y: int, speed: float, efficiency: float) -> np.ndarray:
+    """Fast marching of the arrival times from a source node, see arrival.arrival_time"""
+    height, width = currents_map.shape[0], currents_map.shape[1]
+    times = np.full((height, width), np.inf)
+    accepted = np.zeros((height, width), dtype=np.bool_)
+    heap = [(0., source_y * width + source_x)]
+    for ny in range(max(source_y - 2, 0), min(source_y + 3, height)):         # Point source: exact times around it, for uniform currents
+        for nx in range(max(source_x - 2, 0), min(source_x + 3, width)):
+            times[ny, nx] = travel_time(nx - source_x, ny - source_y, efficiency * float(currents_map[source_y, source_x, 0]),
+                                        efficiency * float(currents_map[source_y, source_x, 1]), speed)
+            if times[ny, nx] < math.inf:
+                heapq.heappush(heap, (times[ny, nx], ny * width + nx))
+    while len(heap) > 0:
+        time, index = heapq.heappop(heap)
+        y, x = index // width, index % width
+        if accepted[y, x]:                                                     # Outdated entry
+            continue
+        accepted[y, x] = True
+        for j in range(8):                                                     # Update the neighbors of the accepted node
+            nx, ny = x - RING[j][0], y - RING[j][1]                            # The accepted node is at RING[j] of the neighbor
+            if not (0 <= nx < width and 0 <= ny < height) or accepted[ny, nx]:
+                continue
+            cx, cy = efficiency * float(currents_map[ny, nx, 0]), efficiency * float(currents_map[ny, nx, 1])
+            best = time + travel_time(-RING[j][0], -RING[j][1], cx, cy, speed)
+            for side in (-1, 1):                                               # The two triangles of the neighbor around the accepted node
+                o = (j + side) % 8
+                ox, oy = nx + RING[o][0], ny + RING[o][1]
+                if 0 <= ox < width and 0 <= oy < height and accepted[oy, ox]:
+                    best = min(best, triangle_update(-RING[o][0], -RING[o][1], RING[j][0] - RING[o][0], RING[j][1] - RING[o][1],
+                                                     time, times[oy, ox], cx, cy, speed))
+            if best < times[ny, nx]:
+                times[ny, nx] = best
+                heapq.heappush(heap, (best, ny * width + nx))
+    return times
@@ -1,32 +1,112 @@
 """Self-steering boat models"""
 
+import math
+
 import numpy as np
 import scipy.interpolate as spint
 import MRLib as mrl
 
+from modules.watchdog import ARRIVED, OUT_OF_BOUNDS, STALLED
+import modules.jit as jit
+import modules.score as score
+import modules.arrival as arrival
+
 # ---------------------------------------------------------------------------- #
 #                                     Boats                                    #
 # ---------------------------------------------------------------------------- #
 
+def truncate_step(position: tuple[float, float], next_position: tuple[float, float], currents_map: np.ndarray, goal: tuple[float, float] = None, precision: float = 0) -> tuple[tuple[float, float], float, bool, bool]:
+    """Truncate a step where it enters the goal's circle or leaves the map
+    position: (x, y) in meters
+    next_position: (x, y) in meters
+    currents_map: currents map
+    goal: goal point coordinates (x, y) in meters, no arrival if None (optional)
+    precision: goal precision in meters (optional)
+    Return the truncated next position, the fraction of the step kept, and whether the boat arrived or left the map
+    """
+    arrival = math.nan if goal is None else mrl.geometry.segment_circle_crossing(position, next_position, goal, precision)
+    leaving = mrl.geometry.segment_box_crossing(position, next_position, (currents_map.shape[1], currents_map.shape[0]))
+    arrived = arrival == arrival and not leaving < arrival                     # Not NaN
+    left = not arrived and leaving == leaving
+    if not (arrived or left):
+        return next_position, 1, False, False
+    fraction = arrival if arrived else leaving
+    return (position[0] + fraction * (next_position[0] - position[0]),
+            position[1] + fraction * (next_position[1] - position[1])), fraction, arrived, left
+
+def run_kernel(boat: object, currents_map: np.ndarray, kernel: callable, *args) -> int:
+    """Run a boat loop kernel of modules.jit chunk by chunk, recording its steps and consulting the watchdog between chunks
+    boat: boat object
+    currents_map: currents map
+    kernel: boat loop kernel
+    args: kernel arguments after the position, before the number of steps
+    Return why the kernel stopped
+    """
+    while True:
+        steps = boat.watchdog.chunk()
+        positions, headings, dts, code = kernel(currents_map, float(boat.position[0]), float(boat.position[1]), *args, steps)
+        boat.extend(positions, currents_map, headings, dts)
+        if code == jit.CHUNK:
+            boat.termination = boat.watchdog.advance(steps, boat.position)
+            if boat.termination is None:
+                continue
+        elif code == jit.ENDED:
+            boat.watchdog.count(len(positions))
+        elif code == jit.ARRIVED:
+            boat.arrived = True
+            boat.termination = ARRIVED
+        elif code == jit.OUT_OF_BOUNDS:
+            boat.termination = OUT_OF_BOUNDS
+        elif code == jit.STALLED:
+            boat.termination = STALLED
+        return code
+
+def use_kernel(boat: object, currents_map: np.ndarray) -> bool:
+    """Tell whether a boat loop runs as a compiled kernel: with the jit backend, on a dense currents map"""
+    return isinstance(currents_map, np.ndarray) and jit.use_jit(boat.backend)
+
+# Boats loops keep their state in plain floats: NumPy scalars and 2-element
+# arrays cost more to create than the arithmetic they carry.
+# The map is the [0, width) × [0, height) box, in the loops, in truncate_step and
+# in modules.fleet alike: a boat on the lower edges is in, on the upper ones out.
+
 # ----------------------------------- Inert ---------------------------------- #
 def inert(boat: object, currents_map: np.ndarray, hydrodynamic_efficiency: float, calculations_tick: float):
     """Inert boat model
     boat: boat object
     currents_map: currents map
     """
-    position = boat.position
-    while (position[0] < currents_map.shape[1] and position[1] < currents_map.shape[0]):
-        next_position = position + calculations_tick * currents_map[int(position[1]), int(position[0]), :] * hydrodynamic_efficiency
-
-        if (next_position[0] >= currents_map.shape[1] or next_position[1] >= currents_map.shape[0]):
+    if use_kernel(boat, currents_map):
+        run_kernel(boat, currents_map, jit.inert_kernel, hydrodynamic_efficiency, calculations_tick)
+        return
+
+    height, width = currents_map.shape[0], currents_map.shape[1]
+    x, y = float(boat.position[0]), float(boat.position[1])
+    while (0 <= x < width and 0 <= y < height):
+        iy, ix = int(y), int(x)
+        next_position = (x + calculations_tick * float(currents_map[iy, ix, 0]) * hydrodynamic_efficiency,
+                         y + calculations_tick * float(currents_map[iy, ix, 1]) * hydrodynamic_efficiency)
+
+        next_position, fraction, arrived, left = truncate_step((x, y), next_position, currents_map)
+        if left:
+            if fraction > 0:
+                boat.add(next_position, currents_map, 0, fraction * calculations_tick)
+            boat.termination = OUT_OF_BOUNDS
             break
 
-        if position[0] == next_position[0] and position[1] == next_position[1]:
+        if x == next_position[0] and y == next_position[1]:
+            boat.termination = STALLED
             break
 
         boat.add(next_position, currents_map, 0)
 
-        position = boat.position
+        x, y = next_position
+
+        boat.termination = boat.watchdog.stop(next_position)
+        if boat.termination is not None:
+            break
+    if boat.termination is None:                                                # Started out of the map
+        boat.termination = OUT_OF_BOUNDS
 
 # ----------------------------- Direction Keeping ---------------------------- #
 def directionKeeping(boat: object, currents_map: np.ndarray, end: tuple[float, float], hydrodynamic_efficiency: float, calculations_tick: float):
@@ -37,27 +117,52 @@ def directionKeeping(boat: object, currents_map: np.ndarray, end: tuple[float, f
     hydrodynamic_efficiency: hydrodynamic efficiency
     calculations_tick: calculations tick in seconds
     """
-    position = boat.position
-    initial_head = mrl.geometry.direction(position, end)
+    height, width = currents_map.shape[0], currents_map.shape[1]
+    x, y = float(boat.position[0]), float(boat.position[1])
+    initial_head = float(mrl.geometry.direction((x, y), end))
+    propulsion = (calculations_tick * boat.base_speed * math.cos(initial_head),
+                  calculations_tick * boat.base_speed * math.sin(initial_head))
     precision = boat.precision
-    while (position[0] < currents_map.shape[1]
-           and position[1] < currents_map.shape[0]
-           and np.sqrt((position[0] - end[0])**2
-                       + (position[1] - end[1])**2) > precision):
-
-        next_position = position + calculations_tick * currents_map[int(position[1]), int(position[0]), :] * hydrodynamic_efficiency + calculations_tick * boat.base_speed * np.array([np.cos(initial_head), np.sin(initial_head)])
+    if use_kernel(boat, currents_map):
+        run_kernel(boat, currents_map, jit.direction_keeping_kernel, initial_head, float(end[0]), float(end[1]),
+                   boat.base_speed, hydrodynamic_efficiency, calculations_tick, precision)
+        if math.sqrt((boat.position[0] - end[0])**2 + (boat.position[1] - end[1])**2) <= precision:
+            boat.arrived = True
+        return
+
+    while (0 <= x < width
+           and 0 <= y < height
+           and math.sqrt((x - end[0])**2
+                         + (y - end[1])**2) > precision):
+
+        iy, ix = int(y), int(x)
+        next_position = (x + calculations_tick * float(currents_map[iy, ix, 0]) * hydrodynamic_efficiency + propulsion[0],
+                         y + calculations_tick * float(currents_map[iy, ix, 1]) * hydrodynamic_efficiency + propulsion[1])
+
+        next_position, fraction, arrived, left = truncate_step((x, y), next_position, currents_map, end, precision)
+        if arrived or left:
+            if fraction > 0:
+                boat.add(next_position, currents_map, initial_head, fraction * calculations_tick)
+            boat.arrived = arrived
+            boat.termination = ARRIVED if arrived else OUT_OF_BOUNDS
+            break
 
-        if (next_position[0] >= currents_map.shape[1]
-            or next_position[1] >= currents_map.shape[0]
-            or mrl.geometry.distance(next_position, position) < .1):
+        if math.sqrt((next_position[0] - x)**2 + (next_position[1] - y)**2) < .1:
+            boat.termination = STALLED
             break
 
         boat.add(next_position, currents_map, initial_head)
 
-        position = boat.position
+        x, y = next_position
+
+        boat.termination = boat.watchdog.stop(next_position)
+        if boat.termination is not None:
+            break
     
-    if np.sqrt((position[0] - end[0])**2 + (position[1] - end[1])**2) <= precision:
+    if math.sqrt((x - end[0])**2 + (y - end[1])**2) <= precision:
         boat.arrived = True
+    elif boat.termination is None:                                              # Out of the map
+        boat.termination = OUT_OF_BOUNDS
         
 
 # --------------------- Controlled Position PI Correction -------------------- #
@@ -69,24 +174,51 @@ def controlledPositionPICorrector(boat: object, currents_map: np.ndarray, goal_p
     hydrodynamic_efficiency: hydrodynamic efficiency
     calculations_tick: calculations tick in seconds
     """
-    heading = -(np.arctan2(boat.position[0]-goal_pos[0], boat.position[1]-goal_pos[1]) + np.pi/2)
+    height, width = currents_map.shape[0], currents_map.shape[1]
+    x, y = float(boat.position[0]), float(boat.position[1])
+    goal_x, goal_y = float(goal_pos[0]), float(goal_pos[1])
     precision = boat.precision
-    while (0 < boat.position[0] < currents_map.shape[1] and 0 < boat.position[1] < currents_map.shape[0]
-           and np.sqrt((boat.position[0] - goal_pos[0])**2 + (boat.position[1] - goal_pos[1])**2) > precision):
-
-        next_position = boat.position + calculations_tick * currents_map[int(boat.position[1]), int(boat.position[0]), :] * hydrodynamic_efficiency + calculations_tick * boat.base_speed * np.array([np.cos(heading), np.sin(heading)])
-
-        if (not 0 <= next_position[0] <= currents_map.shape[1]) or not (0 <= next_position[1] <= currents_map.shape[0]):
+    if use_kernel(boat, currents_map):
+        run_kernel(boat, currents_map, jit.controlled_position_kernel, goal_x, goal_y,
+                   *((float(end[0]), float(end[1])) if can_pass else (0., 0.)), can_pass, bool(last),
+                   boat.base_speed, hydrodynamic_efficiency, calculations_tick, precision)
+        if math.sqrt((boat.position[0] - goal_x)**2 + (boat.position[1] - goal_y)**2) <= precision and not can_pass:
+            boat.arrived = True
+        return
+
+    heading = -(math.atan2(x - goal_x, y - goal_y) + math.pi/2)
+    while (0 <= x < width and 0 <= y < height
+           and math.sqrt((x - goal_x)**2 + (y - goal_y)**2) > precision):
+
+        iy, ix = int(y), int(x)
+        next_position = (x + calculations_tick * float(currents_map[iy, ix, 0]) * hydrodynamic_efficiency + calculations_tick * boat.base_speed * math.cos(heading),
+                         y + calculations_tick * float(currents_map[iy, ix, 1]) * hydrodynamic_efficiency + calculations_tick * boat.base_speed * math.sin(heading))
+
+        if can_pass and (abs(heading + math.atan2(x - end[0], y - end[1]) + math.pi/2) > math.pi/4) and not last:
             break
-        
-        if can_pass and (abs(heading + np.arctan2(boat.position[0]-end[0], boat.position[1]-end[1]) + np.pi/2) > np.pi/4) and not last:
+
+        next_position, fraction, arrived, left = truncate_step((x, y), next_position, currents_map,
+                                                               None if can_pass and not last else goal_pos, precision)
+        if arrived or left:
+            if fraction > 0:
+                boat.add(next_position, currents_map, heading, fraction * calculations_tick)
+            boat.arrived = arrived
+            boat.termination = ARRIVED if arrived else OUT_OF_BOUNDS
             break
 
         boat.add(next_position, currents_map, heading)
 
-        heading = -(np.arctan2(boat.position[0]-goal_pos[0], boat.position[1]-goal_pos[1]) + np.pi/2)
+        x, y = next_position
+
+        boat.termination = boat.watchdog.stop(next_position)
+        if boat.termination is not None:
+            break
+
+        heading = -(math.atan2(x - goal_x, y - goal_y) + math.pi/2)
         
-    if np.sqrt((boat.position[0] - goal_pos[0])**2 + (boat.position[1] - goal_pos[1])**2) <= precision and not can_pass: 
+    if boat.termination is None and not (0 <= x < width and 0 <= y < height):
+        boat.termination = OUT_OF_BOUNDS
+    if math.sqrt((x - goal_x)**2 + (y - goal_y)**2) <= precision and not can_pass: 
         boat.arrived = True
 
 # ------------------------------ Route Following ----------------------------- #
@@ -105,8 +237,13 @@ def routeFollowing(boat: object, currents_map: np.ndarray, end: tuple[float, flo
 
     for goal_pos in route:
         model(boat, currents_map, goal_pos, hydrodynamic_efficiency, calculations_tick, can_pass=True, end=end, last=np.all(goal_pos==route[-1]))
+        if boat.termination is not None:
+            break
             
     if np.sqrt((boat.position[0] - end[0])**2 + (boat.position[1] - end[1])**2) <= precision: boat.arrived = True
+    elif boat.termination is None or (boat.termination == ARRIVED and np.sqrt((route[-1][0] - end[0])**2 + (route[-1][1] - end[1])**2) > precision):
+        boat.arrived = False                                                    # Route ended away from the end
+        boat.termination = STALLED
 
 # ----------------------------- Drift Correction ----------------------------- #
 def driftCorrection(boat: object, currents_map: np.ndarray, end: tuple[float, float], hydrodynamic_efficiency: float):
@@ -123,43 +260,128 @@ def driftCorrection(boat: object, currents_map: np.ndarray, end: tuple[float, fl
 # ---------------------------------------------------------------------------- #
 
 # ------------------------------- Adapted Route ------------------------------ #
-def adaptedRoute(routeObject: object, currents_map: np.ndarray, start: tuple[float, float], end: tuple[float, float]):
+def adaptedRoute(routeObject: object, currents_map: np.ndarray, start: tuple[float, float], end: tuple[float, float], max_offset: int = 20, max_turn: int = 1, smoothing_level: int = 15):
     """Adapt route from direct one
+    The waypoints of the direct route are moved sideways, by whole meters, to the offsets of lowest mrl.route.route_cost.
+    The cost adds up over pairs of consecutive waypoints, so the optimal offsets are found exactly by dynamic programming (Viterbi), in O(waypoints × offsets²).
+    Waypoints are at least a meter apart, and moves never go back along the direct route, so that no cell is visited twice: the cost would reward going back and forth between cells.
     route: route object
     currents_map: currents map
     start: (x, y) in meters
     end: (x, y) in meters
+    max_offset: largest offset from the direct route in meters (optional)
+    max_turn: largest offset change between consecutive waypoints in meters (optional)
+    smoothing_level: number of waypoints of the smoothed route (optional)
     """
+    start, end = np.array(start, dtype=float), np.array(end, dtype=float)
+    if not all(0 <= point[0] < currents_map.shape[1] and 0 <= point[1] < currents_map.shape[0] for point in (start, end)):
+        raise ValueError("Start or end out of the currents map")
+    length = np.sqrt(np.sum((end-start)**2))
+    if length == 0:                                                                         # Nothing to adapt
+        cells = np.array([start, end]).astype(int)
+        routeObject.history = [cells, cells]
+        routeObject.positions = np.array([start, end])
+        return
+    segments = int(np.clip(length, 1, 100))                                                 # Waypoints a meter apart at least
+    direct_route = np.array([i/segments * (end-start) + start for i in range(segments+1)])
+    direction = (end-start) / length
+    normal = np.array([-direction[1], direction[0]])
+    max_offset = min(max_offset, segments//2 * max_turn)                                    # Offsets the route can reach and come back from
+    offsets = np.arange(-max_offset, max_offset+1)
+
+    candidates = (direct_route[:,None,:] + offsets[None,:,None] * normal).astype(int)       # (waypoints, offsets, 2) cells
+    inside = ((candidates[...,0] >= 0) & (candidates[...,0] < currents_map.shape[1])
+              & (candidates[...,1] >= 0) & (candidates[...,1] < currents_map.shape[0]))
+    currents = currents_map[np.clip(candidates[...,1], 0, currents_map.shape[0]-1),
+                            np.clip(candidates[...,0], 0, currents_map.shape[1]-1)]
+    allowed = np.abs(offsets[:,None] - offsets[None,:]) <= max_turn                        # (from, to) turn-rate constraint
+
+    costs = np.where(offsets == 0, 0, np.inf)                                               # Start and end are not moved
+    previous = np.zeros((len(direct_route), len(offsets)), dtype=int)
+    for k in range(1, len(direct_route)):
+        moves = candidates[k][None,:,:] - candidates[k-1][:,None,:]                         # (from, to, 2)
+        transitions = costs[:,None] + np.sum(moves * currents[k-1][:,None,:], axis=-1)
+        forward = (np.sum(moves * direction, axis=-1) > 0) | np.all(moves == 0, axis=-1)   # Never back along the direct route
+        transitions = np.where(allowed & forward & inside[k-1][:,None] & inside[k][None,:], transitions, np.inf)
+        previous[k] = np.argmin(transitions, axis=0)
+        costs = transitions[previous[k], np.arange(len(offsets))]
+
+    if np.isinf(costs[max_offset]):
+        raise ValueError("Route from start to end not found")
+    choice = [max_offset]                                                                   # Backtrack from the unmoved end
+    for k in range(len(direct_route)-1, 0, -1):
+        choice.append(previous[k, choice[-1]])
+    route = candidates[np.arange(len(direct_route)), choice[::-1]]
+
+    routeObject.history = [candidates[:, max_offset], route]
+
+    route = route[np.concatenate([[True], np.any(np.diff(route, axis=0) != 0, axis=1)])]    # Waypoints closer than a cell share it
+    if len(route) < 2:                                                                      # Start and end in the same cell
+        routeObject.positions = np.array([start, end])
+        return
+    tck, u = spint.splprep(np.vstack((route[:,0], route[:,1])), k=min(3, len(route)-1), s=0.0)
+    u_new = np.linspace(u.min(), u.max(), smoothing_level)
+    x_new, y_new = spint.splev(u_new, tck)
 
-    step = 10
-
-    start, end = np.array(start), np.array(end)
-    direct_route = [list(i/100 * (end-start) + start) for i in range(101)]
-    direct_route = np.array([[int(i[0]), int(i[1])] for i in direct_route])
-    routes = [direct_route]
-
-    for k in range(step):
-        routes.append(routes[-1].copy())
-        for i in range(1,len(direct_route)-1):
-            candidate_route = np.copy(routes[-1])
-            candidate_route[i,1] -= 1
-            if mrl.route.route_cost(candidate_route, currents_map) \
-                < mrl.route.route_cost(routes[-1], currents_map):
-                routes[-1] = candidate_route.copy()
+    routeObject.positions = np.array([x_new, y_new]).T
 
-    route = [(int(i[0]), int(i[1])) for i in routes[-1]]
+# ------------------------------ Shortest route ------------------------------ #
+def shortestRoute(routeObject: object, currents_map: np.ndarray, start: tuple[float, float], end: tuple[float, float], distance_weight: float = 1, smoothing_level: int = 15):
+    """Lowest cost route on the currents graph, found by Dijkstra's algorithm, see modules.score
+    route: route object
+    currents_map: currents map
+    start: (x, y) in meters
+    end: (x, y) in meters
+    distance_weight: cost of a meter without currents, the higher the straighter the route (optional)
+    smoothing_level: number of waypoints of the smoothed route (optional)
+    """
+    map_size = (currents_map.shape[1], currents_map.shape[0])
+    if not all(0 <= point[0] < map_size[0] and 0 <= point[1] < map_size[1] for point in (start, end)):
+        raise ValueError("Start or end out of the currents map")
+    source, target = score.map_coords_to_index([start, end], map_size)
 
-    routeObject.history = routes
+    cost_matrix = score.create_cost_matrix(currents_map, distance_weight)
+    path = score.shortest_path(cost_matrix, source, target)
+    if path is None:
+        raise ValueError("Route from start to end not found")
 
+    cells = score.index_to_map_coords(path, map_size)
+    routeObject.history = [cells]
 
-    smoothing_level = 15
+    waypoints = np.concatenate([[start], cells[1:-1], [end]]).astype(float)
+    if len(waypoints) <= 3:
+        routeObject.positions = waypoints
+        return
 
-    tck, u = spint.splprep(np.vstack((routeObject.history[-1][:,0],
-                                      routeObject.history[-1][:,1])), s=0.0)
+    tck, u = spint.splprep(waypoints.T, s=len(waypoints)/4)             # Within about half a cell of the staircase
     u_new = np.linspace(u.min(), u.max(), smoothing_level)
     x_new, y_new = spint.splev(u_new, tck)
 
     routeObject.positions = np.array([x_new, y_new]).T
+    routeObject.positions[0], routeObject.positions[-1] = start, end   # The smoothing spline does not go through them
+
+# ------------------------------ Fastest route ------------------------------- #
+def fastestRoute(routeObject: object, currents_map: np.ndarray, start: tuple[float, float], end: tuple[float, float], base_speed: float = 2, hydrodynamic_efficiency: float = 1, smoothing_level: int = 15):
+    """Time-optimal route, backtracked from the arrival time field from start, see modules.arrival
+    route: route object
+    currents_map: currents map
+    start: (x, y) in meters
+    end: (x, y) in meters
+    base_speed: boats' base speed in m/s (optional)
+    hydrodynamic_efficiency: hydrodynamic efficiency (optional)
+    smoothing_level: number of waypoints of the route (optional)
+    """
+    if not all(0 <= point[0] < currents_map.shape[1] and 0 <= point[1] < currents_map.shape[0] for point in (start, end)):
+        raise ValueError("Start or end out of the currents map")
+    arrival_times = arrival.arrival_time(currents_map, start, base_speed, hydrodynamic_efficiency)
+    route = arrival.backtrack(arrival_times, currents_map, start, end, base_speed, hydrodynamic_efficiency)
+    routeObject.history = [route]
+    routeObject.arrival_times = arrival_times
+
+    distances = np.concatenate([[0], np.cumsum(np.sqrt(np.sum(np.diff(route, axis=0)**2, axis=1)))])
+    u_new = np.linspace(0, distances[-1], smoothing_level)                     # Evenly spaced along the route
+    routeObject.positions = np.array([np.interp(u_new, distances, route[:,0]),
+                                      np.interp(u_new, distances, route[:,1])]).T
 
 # ------------------------------- Direct route ------------------------------- #
 def directRoute(routeObject: object, currents_map: np.ndarray, start: tuple[float, float], end: tuple[float, float]):
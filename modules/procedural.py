@@ -0,0 +1,190 @@
+"""Procedural currents module: analytic currents evaluated on demand, without a grid"""
+
+import abc
+
+import numpy as np
+
+class Primitive(abc.ABC):
+    """Analytic currents primitive, evaluated at any (N, 2) positions and time"""
+    @abc.abstractmethod
+    def __call__(self, positions: np.ndarray, time: float = 0) -> np.ndarray:
+        """Return the (N, 2) currents at the given positions
+        positions: (N, 2) positions (x, y) in meters
+        time: in seconds
+        """
+
+    def __add__(self, other: 'Primitive') -> 'Sum':
+        return Sum([self, other])
+
+class Sum(Primitive):
+    """Superposition of primitives"""
+    def __init__(self, primitives: list[Primitive]):
+        self.primitives = []
+        for primitive in primitives:
+            self.primitives += primitive.primitives if isinstance(primitive, Sum) else [primitive]
+
+    def __call__(self, positions: np.ndarray, time: float = 0) -> np.ndarray:
+        positions = np.asarray(positions, dtype=float)
+        currents = np.zeros(positions.shape)
+        for primitive in self.primitives:
+            currents += primitive(positions, time)
+        return currents
+
+# ---------------------------------------------------------------------------- #
+#                                  Primitives                                  #
+# ---------------------------------------------------------------------------- #
+
+class Uniform(Primitive):
+    """Uniform currents"""
+    def __init__(self, speed: float, direction: float = 0):
+        """speed: in m/s
+        direction: in radians
+        """
+        self.speed = speed
+        self.direction = direction
+
+    def __call__(self, positions: np.ndarray, time: float = 0) -> np.ndarray:
+        positions = np.asarray(positions, dtype=float)
+        currents = np.empty(positions.shape)
+        currents[...,0] = self.speed * np.cos(self.direction)
+        currents[...,1] = self.speed * np.sin(self.direction)
+        return currents
+
+class Vortex(Primitive):
+    """Lamb-Oseen vortex, reaching its maximum speed at the core radius"""
+    def __init__(self, center: tuple[float, float], speed: float, radius: float):
+        """center: (x, y) in meters
+        speed: maximum tangential speed in m/s, counterclockwise if positive
+        radius: core radius in meters
+        """
+        self.center = center
+        self.speed = speed
+        self.radius = radius
+
+    def __call__(self, positions: np.ndarray, time: float = 0) -> np.ndarray:
+        positions = np.asarray(positions, dtype=float)
+        dx, dy = positions[...,0] - self.center[0], positions[...,1] - self.center[1]
+        r2 = np.maximum(dx**2 + dy**2, 1e-12)
+        tangential = 1.3982 * self.speed * self.radius * (1 - np.exp(-1.2564 * r2 / self.radius**2)) / r2  # Tangential speed over r
+        return np.stack([-dy * tangential, dx * tangential], axis=-1)
+
+class ShearLayer(Primitive):
+    """Shear layer, the currents reverse across a line"""
+    def __init__(self, point: tuple[float, float], speed: float, width: float, direction: float = 0):
+        """point: (x, y) point of the line in meters
+        speed: currents speed far from the line in m/s
+        width: layer half-width in meters
+        direction: direction of the line and of the currents on its left side, in radians
+        """
+        self.point = point
+        self.speed = speed
+        self.width = width
+        self.direction = direction
+
+    def __call__(self, positions: np.ndarray, time: float = 0) -> np.ndarray:
+        positions = np.asarray(positions, dtype=float)
+        ux, uy = np.cos(self.direction), np.sin(self.direction)
+        across = -(positions[...,0] - self.point[0]) * uy + (positions[...,1] - self.point[1]) * ux
+        speed = self.speed * np.tanh(across / self.width)
+        return np.stack([speed * ux, speed * uy], axis=-1)
+
+class Gyre(Primitive):
+    """Closed gyre filling a rectangle, null outside of it"""
+    def __init__(self, origin: tuple[float, float], extent: tuple[float, float], speed: float):
+        """origin: (x, y) bottom-left corner in meters
+        extent: (x, y) size in meters
+        speed: maximum speed in m/s, counterclockwise if positive
+        """
+        self.origin = origin
+        self.extent = extent
+        self.speed = speed
+
+    def __call__(self, positions: np.ndarray, time: float = 0) -> np.ndarray:
+        positions = np.asarray(positions, dtype=float)
+        x = (positions[...,0] - self.origin[0]) / self.extent[0]
+        y = (positions[...,1] - self.origin[1]) / self.extent[1]
+        inside = (x >= 0) & (x <= 1) & (y >= 0) & (y <= 1)
+        amplitude = self.speed * min(self.extent) / np.array(self.extent)      # Stream function psi = -A sin(pi x) sin(pi y)
+        currents = np.stack([amplitude[1] * np.sin(np.pi*x) * np.cos(np.pi*y),
+                             -amplitude[0] * np.cos(np.pi*x) * np.sin(np.pi*y)], axis=-1)
+        return np.where(inside[..., None], currents, 0)
+
+class TidalJet(Primitive):
+    """Jet flowing out of an inlet, reversing with the tide"""
+    def __init__(self, inlet: tuple[float, float], speed: float, width: float, length: float, direction: float = 0, period: float = None):
+        """inlet: (x, y) in meters
+        speed: jet speed at the inlet in m/s
+        width: jet half-width in meters
+        length: decay length along the jet in meters
+        direction: jet direction in radians
+        period: tide period in seconds, steady jet if None (optional)
+        """
+        self.inlet = inlet
+        self.speed = speed
+        self.width = width
+        self.length = length
+        self.direction = direction
+        self.period = period
+
+    def __call__(self, positions: np.ndarray, time: float = 0) -> np.ndarray:
+        positions = np.asarray(positions, dtype=float)
+        ux, uy = np.cos(self.direction), np.sin(self.direction)
+        dx, dy = positions[...,0] - self.inlet[0], positions[...,1] - self.inlet[1]
+        along, across = dx * ux + dy * uy, -dx * uy + dy * ux
+        speed = self.speed * np.exp(-(across / self.width)**2) * np.where(along >= 0, np.exp(-np.maximum(along, 0) / self.length), 0)
+        if self.period is not None:
+            speed = speed * np.cos(2*np.pi * time / self.period)
+        return np.stack([speed * ux, speed * uy], axis=-1)
+
+# ---------------------------------------------------------------------------- #
+#                                Currents source                               #
+# ---------------------------------------------------------------------------- #
+
+class ProceduralCurrents:
+    """Procedural currents class
+
+    Currents are evaluated exactly at the queried positions, so the memory used
+    does not depend on the map extent and results do not depend on a resolution.
+    """
+    def __init__(self, size: tuple, field: Primitive):
+        """size: (x, y) in meters
+        field: primitive, or sum of primitives
+        """
+        self.size = size
+        self.field = field
+        self.time = 0
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the equivalent dense currents map"""
+        return (self.size[1], self.size[0], 2)
+
+    def sample(self, positions: np.ndarray, method: str = "nearest", time: float = None) -> tuple[np.ndarray, np.ndarray]:
+        """Return the currents at the given positions, see CurrentMap.sample
+        method: ignored, the field is evaluated exactly
+        time: in seconds, the current time if None (optional)
+        """
+        positions = np.asarray(positions, dtype=float)
+        inside = ((positions[...,0] >= 0) & (positions[...,0] < self.size[0])
+                  & (positions[...,1] >= 0) & (positions[...,1] < self.size[1]))
+        currents = self.field(positions, self.time if time is None else time)
+        return np.where(inside[..., None], currents, 0), inside
+
+    def advance(self, dt: float):
+        """Advance the current time
+        dt: in seconds
+        """
+        self.time += dt
+
+    def rasterize(self, resolution: float = 1, time: float = None) -> np.ndarray:
+        """Return the currents on a regular grid, for plotting
+        resolution: grid step in meters
+        time: in seconds, the current time if None (optional)
+        """
+        X, Y = np.meshgrid(np.arange(0, self.size[0], resolution), np.arange(0, self.size[1], resolution))
+        return self.field(np.stack([X, Y], axis=-1), self.time if time is None else time)
+
+    def __getitem__(self, key: tuple):
+        """Index the currents at the current time like a dense (y, x, 2) currents map, at the cell corner"""
+        iy, ix, *rest = key
+        return self.field(np.array([ix, iy], dtype=float), self.time)[tuple(rest)]
@@ -0,0 +1,210 @@
+"""Retention module: which steps of a boat's trajectory are kept, and where
+
+A retention policy selects the recorded steps: every step, every k-th step, or
+the steps needed to keep the trajectory within a distance of the full one. The
+kept steps stay in memory or are spilled by fixed-size chunks to append-only
+.npy files, which are read back lazily by memory mapping.
+
+The positions, times, speeds, directions and powers of a step are kept or
+dropped together, so that the series stay aligned: the speeds, directions and
+powers are those of the steps ending at positions[1:], at times[1:].
+"""
+
+import os
+
+import numpy as np
+
+HEADER_SIZE = 128                                                               # .npy header of fixed size, rewritten in place
+
+class SpillBuffer:
+    """Append-only .npy file buffer
+
+    Values are kept in a fixed-size chunk, appended to the file when the chunk
+    is full. The header is rewritten with the new shape at each flush, so the
+    file is a valid .npy file after every flush.
+    """
+    def __init__(self, path: str, shape: tuple = (), chunk_size: int = 65536):
+        """path: .npy file path, overwritten
+        shape: shape of each value
+        chunk_size: number of values kept in memory before being appended to the file
+        """
+        self.path = path
+        self.chunk = np.empty((chunk_size,) + shape)
+        self.pending = 0
+        self.flushed = 0
+        self.set(np.empty((0,) + shape))
+
+    @property
+    def count(self) -> int:
+        """Number of appended values"""
+        return self.flushed + self.pending
+
+    def header(self) -> bytes:
+        """Return the .npy header of the flushed values"""
+        header = repr({'descr': '<f8', 'fortran_order': False, 'shape': (self.flushed,) + self.chunk.shape[1:]})
+        header = header.ljust(HEADER_SIZE - 11) + "\n"
+        return b"\x93NUMPY\x01\x00" + (HEADER_SIZE - 10).to_bytes(2, "little") + header.encode("latin1")
+
+    def append(self, value):
+        """Append a value"""
+        self.chunk[self.pending] = value
+        self.pending += 1
+        if self.pending == len(self.chunk):
+            self.flush()
+
+    def extend(self, values: np.ndarray):
+        """Append several values"""
+        values = np.asarray(values, dtype=float).reshape((-1,) + self.chunk.shape[1:])
+        while len(values):
+            count = min(len(values), len(self.chunk) - self.pending)
+            self.chunk[self.pending:self.pending + count] = values[:count]
+            self.pending += count
+            values = values[count:]
+            if self.pending == len(self.chunk):
+                self.flush()
+
+    def flush(self):
+        """Append the pending values to the file"""
+        if self.pending == 0:
+            return
+        with open(self.path, "r+b") as file:
+            file.seek(0, 2)
+            file.write(self.chunk[:self.pending].tobytes())
+            self.flushed += self.pending
+            self.pending = 0
+            file.seek(0)
+            file.write(self.header())
+
+    def array(self) -> np.ndarray:
+        """Return the appended values, memory mapped from the file"""
+        self.flush()
+        if self.flushed == 0:
+            return np.empty((0,) + self.chunk.shape[1:])
+        return np.load(self.path, mmap_mode="r")
+
+    def set(self, values: np.ndarray):
+        """Replace the appended values, in a new file: arrays returned by array before are left untouched"""
+        values = np.asarray(values, dtype=float).reshape((-1,) + self.chunk.shape[1:])
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)                                                # Unlinked, not truncated: open memory maps keep the old file
+        self.pending = 0
+        self.flushed = len(values)
+        with open(self.path, "wb") as file:
+            file.write(self.header())
+            file.write(values.tobytes())
+
+# ---------------------------------------------------------------------------- #
+#                                   Policies                                   #
+# ---------------------------------------------------------------------------- #
+
+# A step record is a (position, time, speed, direction, power) tuple. Policies
+# hold the state of a single boat's run: use one instance per boat.
+
+class Retention:
+    """Retention policy class: every step is kept"""
+    selects = False                                                             # Whether steps go through add and flush
+
+    def __init__(self, spill: str = None, chunk_size: int = 65536):
+        """spill: directory of the spilled .npy files, kept in memory if None (optional)
+        chunk_size: number of values kept in memory before being spilled (optional)
+        """
+        self.spill = spill
+        self.chunk_size = chunk_size
+
+    def path(self, name: str) -> str:
+        """Return the path of a spilled series"""
+        return os.path.join(self.spill, f"{name}.npy")
+
+    def reset(self, position: tuple[float, float]):
+        """Start a run
+        position: starting position (x, y) in meters
+        """
+        pass
+
+    def add(self, record: tuple) -> list[tuple]:
+        """Add a step and return the steps to keep"""
+        return [record]
+
+    def flush(self) -> list[tuple]:
+        """Return the pending steps to keep, the trajectory being read or ended"""
+        return []
+
+class Decimate(Retention):
+    """Every k-th step is kept, and the last one"""
+    selects = True
+
+    def __init__(self, k: int, spill: str = None, chunk_size: int = 65536):
+        """k: one step out of k is kept"""
+        super().__init__(spill, chunk_size)
+        self.k = k
+        self.reset(None)
+
+    def reset(self, position: tuple[float, float]):
+        self.steps = 0
+        self.pending = None
+
+    def add(self, record: tuple) -> list[tuple]:
+        self.steps += 1
+        if self.steps % self.k == 0:
+            self.pending = None
+            return [record]
+        self.pending = record
+        return []
+
+    def flush(self) -> list[tuple]:
+        records = [] if self.pending is None else [self.pending]
+        self.pending = None
+        return records
+
+class Simplify(Retention):
+    """Online simplification: the dropped positions are within a tolerance of the kept trajectory
+
+    Opening window algorithm: the window of steps since the last kept position,
+    the anchor, grows while all its positions are within the tolerance of the
+    segment from the anchor to the newest position. When one is not, the
+    previous step is kept and becomes the anchor. Same bound as Douglas-Peucker,
+    without knowing the trajectory in advance.
+    """
+    selects = True
+
+    def __init__(self, tolerance: float, max_window: int = 256, spill: str = None, chunk_size: int = 65536):
+        """tolerance: largest distance of a dropped position to the kept trajectory, in meters
+        max_window: largest number of steps between two kept steps, bounding the cost of a step (optional)
+        """
+        super().__init__(spill, chunk_size)
+        self.tolerance = tolerance
+        self.window = np.empty((max_window, 2))
+        self.reset((0, 0))
+
+    def reset(self, position: tuple[float, float]):
+        self.anchor = np.array(position, dtype=float)
+        self.records = []
+
+    def add(self, record: tuple) -> list[tuple]:
+        count = len(self.records)
+        self.window[count] = record[0]
+        self.records.append(record)
+        if count == 0:
+            return []
+
+        segment = self.window[count] - self.anchor
+        points = self.window[:count] - self.anchor
+        length = segment @ segment
+        t = np.clip(points @ segment / length, 0, 1) if length > 0 else np.zeros(count)
+        distances = np.sqrt(np.sum((points - t[:, None] * segment)**2, axis=1))
+        if np.max(distances) <= self.tolerance and count + 1 < len(self.window):
+            return []
+
+        kept = self.records[-2]
+        self.anchor = self.window[count-1].copy()
+        self.window[0] = self.window[count]
+        self.records = [record]
+        return [kept]
+
+    def flush(self) -> list[tuple]:
+        records = self.records[-1:]
+        if records:
+            self.anchor = self.window[len(self.records)-1].copy()
+        self.records = []
+        return records
@@ -1,49 +1,103 @@
 import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.csgraph as csgraph
 
-def create_score_matrix(currents_map: np.ndarray):
-    """Create the score matrix. The score matrix contains the score of each cell of the currents map to reach their neighbors, score is calculated by a dot product of relative direction and currents direction (and its speed).
+NEIGHBORS = [(-1, -1), (0, -1), (1, -1),
+             (-1, 0),           (1, 0),
+             (-1, 1),  (0, 1),  (1, 1)]                 # (dx, dy) offsets, by increasing neighbor index
+
+def neighbors_graph(values: np.ndarray, map_size: tuple[int, int]) -> sparse.csr_matrix:
+    """Return the (H·W, H·W) sparse CSR graph of the 8-neighbor moves, whose rows and columns are sorted
+    values: (H·W, 8) value of each move, by NEIGHBORS index, those leaving the map being dropped
+    map_size: map size (width, height)
+    """
+    width, height = map_size
+    moves = np.array(NEIGHBORS)
+    valid = np.ones((height, width, len(moves)), dtype=bool)                   # Only the border cells miss neighbors
+    valid[:, 0, moves[:,0] < 0] = valid[:, -1, moves[:,0] > 0] = False
+    valid[0, :, moves[:,1] < 0] = valid[-1, :, moves[:,1] > 0] = False
+    valid = valid.reshape(height * width, -1)
+
+    index = np.int32 if height * width < 2**31 else np.int64
+    columns = np.arange(height * width, dtype=index)[:, None] + (moves[:,1] * width + moves[:,0]).astype(index)
+    xs = 3 - (np.arange(width) == 0) - (np.arange(width) == width - 1)         # Neighbors per row and column, the cell included
+    ys = 3 - (np.arange(height) == 0) - (np.arange(height) == height - 1)
+    indptr = np.zeros(height * width + 1, dtype=index)
+    np.cumsum((ys[:, None] * xs - 1).ravel(), out=indptr[1:])
+    return sparse.csr_matrix((values[valid], columns[valid], indptr), shape=(height * width,)*2)
+
+def neighbor_scores(currents_map: np.ndarray) -> np.ndarray:
+    """Return the (H·W, 8) scores of the moves to the 8 neighbors, by NEIGHBORS index, see create_score_matrix"""
+    return np.asarray(currents_map, dtype=float).reshape(-1, 2) @ -np.array(NEIGHBORS, dtype=float).T
+
+def create_score_matrix(currents_map: np.ndarray) -> sparse.csr_matrix:
+    """Create the score matrix. The score matrix contains the score of each cell of the currents map to reach their 8 neighbors, score is calculated by a dot product of relative direction and currents direction (and its speed).
+    The matrix is a (H·W, H·W) sparse CSR graph, indexed by map_coords_to_index: score_matrix[k, l] is the score from cell k to its neighbor l.
+    currents_map: currents map
+    """
+    return neighbors_graph(neighbor_scores(currents_map), (currents_map.shape[1], currents_map.shape[0]))
+
+def create_cost_matrix(currents_map: np.ndarray, distance_weight: float = 1) -> sparse.csr_matrix:
+    """Create the cost matrix, the score matrix made non-negative for shortest path searches.
+    Each score is shifted by the move's length times the maximum currents speed, which is at least the currents' contribution, plus distance_weight per meter: moves with the currents cost at least distance_weight per meter, moves against them up to 2 max speed + distance_weight.
     currents_map: currents map
+    distance_weight: cost of a meter without currents, the higher the straighter the paths (optional)
     """
-    cm_size = currents_map.shape[:2]
-    score_matrix = np.inf * np.ones([cm_size[0] * cm_size[1]]*2)
-
-    for i in range(cm_size[0]):
-        for j in range(cm_size[1]):
-            k = i*cm_size[1] + j                        # Current cell index
-            if i == j:
-                score_matrix[k, k] = 0
-            if i > 0:                                   # Up cell
-                score_matrix[k, k-cm_size[0]] = np.dot(currents_map[i, j, :], np.array([0, -1]))
-            if i < cm_size[0]-1:                        # Down cell
-                score_matrix[k, k+cm_size[0]] = np.dot(currents_map[i, j, :], np.array([0, 1]))
-            if j > 0:                                   # Left cell
-                score_matrix[k, k-1] = np.dot(currents_map[i, j, :], np.array([-1, 0]))
-            if j < cm_size[1]-1:                        # Right cell
-                score_matrix[k, k+1] = np.dot(currents_map[i, j, :], np.array([1, 0]))
-            if i > 0 and j > 0:                         # Up left cell
-                score_matrix[k, k-cm_size[0]-1] = np.dot(currents_map[i, j, :], np.array([-1, -1]))
-            if i > 0 and j < cm_size[1]-1:              # Up right cell
-                score_matrix[k, k-cm_size[0]+1] = np.dot(currents_map[i, j, :], np.array([1, -1]))
-            if i < cm_size[0]-1 and j > 0:              # Down left cell
-                score_matrix[k, k+cm_size[0]-1] = np.dot(currents_map[i, j, :], np.array([-1, 1]))
-            if i < cm_size[0]-1 and j < cm_size[1]-1:   # Down right cell
-                score_matrix[k, k+cm_size[0]+1] = np.dot(currents_map[i, j, :], np.array([1, 1]))
-
-    score_matrix[score_matrix != np.inf] *= -1
-
-    return score_matrix
-
-
-def map_coords_to_index(coords: tuple[int, int], map_size: tuple[int, int]):
+    max_speed = np.sqrt(np.max(np.einsum('...i,...i', currents_map, currents_map)))
+    costs = neighbor_scores(currents_map)
+    costs += np.sqrt(np.sum(np.square(NEIGHBORS), axis=1)) * (max_speed + distance_weight)   # Moves lengths
+    return neighbors_graph(costs, (currents_map.shape[1], currents_map.shape[0]))
+
+def shortest_path(cost_matrix: sparse.csr_matrix, source: int, target: int) -> np.ndarray:
+    """Return the cells indices of the lowest cost path from source to target, None if target can not be reached.
+    SciPy's compiled Dijkstra's algorithm from source, the path being rebuilt from the predecessors.
+    cost_matrix: non-negative costs graph, see create_cost_matrix
+    source: source cell index
+    target: target cell index
+    """
+    costs, predecessors = csgraph.dijkstra(cost_matrix, indices=source, return_predecessors=True)
+    if np.isinf(costs[target]):
+        return None
+    path = [int(target)]
+    while path[-1] != source:
+        path.append(int(predecessors[path[-1]]))
+    return np.array(path[::-1])
+
+def cost_to_go(cost_matrix: sparse.csr_matrix, target: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the lowest cost from every cell to a target cell, and the next cell of the lowest cost path, -1 for the target and unreachable cells.
+    A single backward solve: Dijkstra's algorithm from the target on the transposed graph, whose predecessors are the successors on the forward graph.
+    cost_matrix: non-negative costs graph, see create_cost_matrix
+    target: target cell index
+    """
+    costs, successors = csgraph.dijkstra(cost_matrix.T.tocsr(), indices=target, return_predecessors=True)
+    return costs, np.where(successors < 0, -1, successors)
+
+def successor_headings(successors: np.ndarray, map_size: tuple[int, int]) -> np.ndarray:
+    """Return the (y, x, 2) unit vectors from each cell to its next cell, null for the cells without one
+    successors: (H·W,) next cells, see cost_to_go
+    map_size: map size (width, height)
+    """
+    indices = np.arange(len(successors))
+    moves = index_to_map_coords(np.where(successors < 0, indices, successors), map_size) - index_to_map_coords(indices, map_size)
+    lengths = np.sqrt(np.sum(moves**2, axis=-1, keepdims=True))
+    field = np.divide(moves, lengths, out=np.zeros(moves.shape), where=lengths > 0)
+    return field.reshape(map_size[1], map_size[0], 2)
+
+
+def map_coords_to_index(coords: tuple[int, int] | np.ndarray, map_size: tuple[int, int]):
     """Map coordinates to index
-    coords: coordinates (x, y)
+    coords: coordinates (x, y), or (..., 2) array of coordinates
     map_size: map size (width, height)
+    Return the index as a 0-d integer array, or the (...) array of indices
     """
-    return coords[0] + coords[1] * map_size[0]
+    coords = np.asarray(coords).astype(int)
+    return coords[..., 0] + coords[..., 1] * map_size[0]
 
-def index_to_map_coords(index: int, map_size: tuple[int, int]):
+def index_to_map_coords(index: int | np.ndarray, map_size: tuple[int, int]):
     """Map index to coordinates
-    index: index
+    index: index, or array of indices
     map_size: map size (width, height)
+    Return the (2,) array of coordinates (x, y), or the (..., 2) array of coordinates, not a tuple
     """
-    return (index % map_size[0], index // map_size[0])
\ No newline at end of file
+    index = np.asarray(index)
+    return np.stack([index % map_size[0], index // map_size[0]], axis=-1)
@@ -0,0 +1,150 @@
+"""Steering models protocol: a model only maps the boats' state to commanded headings,
+the simulation loop being owned by the fleet engine"""
+
+import abc
+
+import numpy as np
+
+import modules.score as score
+from modules.currents import sample_currents
+
+class SteeringModel(abc.ABC):
+    """Steering model class
+
+    A steering model is given the rows of the still active boats and returns
+    their commanded headings, vectorized over any number of boats. Integration,
+    termination and recording are left to the engine (see modules.fleet).
+    """
+    inert = False                                                               # No propulsion, the boat drifts
+    stall_distance = 0                                                          # Boats moving less than this distance in a tick stop, in meters
+
+    def reset(self, start_positions: np.ndarray, goals: np.ndarray):
+        """Initialize the model's state before a run
+        start_positions: (N, 2) starting positions (x, y) in meters
+        goals: (N, 2) goal positions (x, y) in meters
+        """
+        pass
+
+    @abc.abstractmethod
+    def heading(self, boats: np.ndarray, positions: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        """Return the commanded headings of some boats, in radians
+        boats: (n,) rows of the boats in the fleet
+        positions: (n, 2) positions (x, y) in meters
+        goals: (n, 2) goal positions (x, y) in meters
+        """
+
+def goal_headings(positions: np.ndarray, goals: np.ndarray) -> np.ndarray:
+    """Return the headings from positions to goals, in radians"""
+    return -(np.arctan2(positions[:,0] - goals[:,0], positions[:,1] - goals[:,1]) + np.pi/2)
+
+# ---------------------------------------------------------------------------- #
+#                                   Adapters                                   #
+# ---------------------------------------------------------------------------- #
+
+# ----------------------------------- Inert ---------------------------------- #
+class Inert(SteeringModel):
+    """Inert boat model, see models.inert"""
+    inert = True
+    stall_distance = 1e-12
+
+    def heading(self, boats: np.ndarray, positions: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        return np.zeros(len(boats))
+
+# ----------------------------- Direction Keeping ---------------------------- #
+class DirectionKeeping(SteeringModel):
+    """Initial headed boat model, see models.directionKeeping"""
+    stall_distance = .1
+
+    def reset(self, start_positions: np.ndarray, goals: np.ndarray):
+        dx, dy = start_positions[:,0] - goals[:,0], start_positions[:,1] - goals[:,1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.initial_headings = np.where(dx == 0, np.where(dy > 0, -np.pi/2, np.pi/2),
+                                             np.arctan(dy / dx))                # Same as mrl.geometry.direction
+
+    def heading(self, boats: np.ndarray, positions: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        return self.initial_headings[boats]
+
+# --------------------- Controlled Position PI Correction -------------------- #
+class ControlledPositionPICorrector(SteeringModel):
+    """Controlled position PI corrector boat model, see models.controlledPositionPICorrector"""
+    def heading(self, boats: np.ndarray, positions: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        return goal_headings(positions, goals)
+
+# ------------------------------ Route Following ----------------------------- #
+class RouteFollowing(SteeringModel):
+    """Route following boat model, see models.routeFollowing
+
+    Each boat steers to its current waypoint, and passes to the next one when
+    it is within precision of it, or when heading to it would deviate more than
+    45° from the direction of the goal.
+    """
+    def __init__(self, route: object, precision: float = 1):
+        """route: Route object, or (K, 2) waypoints (x, y) in meters
+        precision: waypoints precision in meters
+        """
+        self.route = route
+        self.precision = precision
+
+    def reset(self, start_positions: np.ndarray, goals: np.ndarray):
+        self.waypoints = np.asarray(getattr(self.route, 'positions', self.route), dtype=float)
+        self.waypoint = np.zeros(len(start_positions), dtype=int)
+
+    def heading(self, boats: np.ndarray, positions: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        last = len(self.waypoints) - 1
+        while True:
+            waypoint = self.waypoint[boats]
+            headings = goal_headings(positions, self.waypoints[waypoint])
+            distance = np.sqrt(np.sum((positions - self.waypoints[waypoint])**2, axis=1))
+            deviation = np.abs(headings + np.arctan2(positions[:,0] - goals[:,0], positions[:,1] - goals[:,1]) + np.pi/2)
+            passed = (waypoint < last) & ((distance <= self.precision) | (deviation > np.pi/4))
+            if not np.any(passed):
+                return headings
+            self.waypoint[boats[passed]] += 1
+
+# --------------------------------- Cost-to-go -------------------------------- #
+class CostToGo(SteeringModel):
+    """Cost-to-go boat model
+
+    The lowest cost path to a goal is solved once backward from the goal over
+    the whole currents graph (see modules.score), giving each cell the heading
+    to its next cell. Boats steer by a bilinear lookup of this heading field,
+    at constant cost per tick. The fields are kept per goal cell, so a single
+    solve serves every boat, start position and run on the same map. Close to
+    the goal, boats head straight to it.
+    """
+    def __init__(self, currents_map: np.ndarray, distance_weight: float = 1):
+        """currents_map: (y, x, 2) currents map the fields are solved on
+        distance_weight: cost of a meter without currents, see score.create_cost_matrix (optional)
+        """
+        self.map_size = (currents_map.shape[1], currents_map.shape[0])
+        self.cost_matrix = score.create_cost_matrix(np.asarray(currents_map), distance_weight)
+        self.costs = {}                                                         # Cost-to-go fields, by goal cell
+        self.headings = {}                                                      # Heading fields, by goal cell
+
+    def solve(self, target: int):
+        """Solve the cost-to-go and heading fields of a goal cell, if not solved yet"""
+        if target not in self.costs:
+            costs, successors = score.cost_to_go(self.cost_matrix, target)
+            self.costs[target] = costs.reshape(self.map_size[1], self.map_size[0])
+            self.headings[target] = score.successor_headings(successors, self.map_size)
+
+    def reset(self, start_positions: np.ndarray, goals: np.ndarray):
+        self.targets = score.map_coords_to_index(np.clip(goals, 0, np.array(self.map_size) - 1), self.map_size)
+        for target in np.unique(self.targets):
+            self.solve(int(target))
+
+    def heading(self, boats: np.ndarray, positions: np.ndarray, goals: np.ndarray) -> np.ndarray:
+        headings = goal_headings(positions, goals)
+        targets = self.targets[boats]
+        for target in np.unique(targets):
+            rows = targets == target
+            directions = sample_currents(self.headings[int(target)], positions[rows], "bilinear")[0]
+            near = (np.sum(directions**2, axis=1) < .25) | (np.sum((positions[rows] - goals[rows])**2, axis=1) < 2)
+            headings[rows] = np.where(near, headings[rows], np.arctan2(directions[:,1], directions[:,0]))
+        return headings
+
+models = {
+    'inert': Inert,
+    'directionKeeping': DirectionKeeping,
+    'controlledPositionPICorrector': ControlledPositionPICorrector,
+}
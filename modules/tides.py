@@ -0,0 +1,123 @@
+"""Time-varying currents module, for passages under changing tides"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from modules.currents import interpolate_currents
+
+class TidalCurrents:
+    """Tidal currents class
+
+    Currents are a (T, y, x, 2) cube of time slices, one every slice_interval
+    seconds. Slices are generated or loaded when the simulated time reaches
+    them and only a small window of them stays in memory. Currents between two
+    slices are linearly interpolated in time.
+    """
+    def __init__(self, size: tuple, slice_interval: float, loader: callable, slices_count: int = None, window: int = 4, periodic: bool = False):
+        """Initialize the tidal currents, no slice is loaded yet
+        size: (x, y) in meters
+        slice_interval: time between two slices in seconds
+        loader: function returning the (y, x, 2) currents of a slice index
+        slices_count: number of slices T, unbounded if None (optional)
+        window: number of slices kept in memory
+        periodic: loop over the slices after the last one, else hold the last one (optional)
+        """
+        self.size = size
+        self.slice_interval = slice_interval
+        self.loader = loader
+        self.slices_count = slices_count
+        self.window = max(window, 2)
+        self.periodic = periodic
+        self.slices = OrderedDict()
+        self.loaded_slices = 0
+        self.time = 0
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of a (y, x, 2) time slice"""
+        return (self.size[1], self.size[0], 2)
+
+    @classmethod
+    def from_file(cls, path: str, slice_interval: float, window: int = 4, periodic: bool = False) -> 'TidalCurrents':
+        """Stream the slices of a (T, y, x, 2) .npy currents cube, memory-mapped
+        path: .npy file path
+        slice_interval: time between two slices in seconds
+        """
+        cube = np.load(path, mmap_mode='r')
+        return cls((cube.shape[2], cube.shape[1]), slice_interval, lambda k: np.array(cube[k]),
+                   cube.shape[0], window, periodic)
+
+    @classmethod
+    def harmonic(cls, base_map: np.ndarray, period: float, slice_interval: float, residual: np.ndarray = None, window: int = 4) -> 'TidalCurrents':
+        """Generate a tide reversing base_map every half period, on top of a steady residual
+        base_map: (y, x, 2) currents at high tide
+        period: tide period in seconds
+        slice_interval: time between two slices in seconds
+        residual: (y, x, 2) steady currents (optional)
+        """
+        residual = np.zeros_like(base_map) if residual is None else residual
+        return cls((base_map.shape[1], base_map.shape[0]), slice_interval,
+                   lambda k: residual + base_map * np.cos(2*np.pi * k*slice_interval / period),
+                   window=window)
+
+    def slice_index(self, index: int) -> int:
+        """Return the slice actually used for a slice index"""
+        if self.slices_count is None:
+            return max(index, 0)
+        if self.periodic:
+            return index % self.slices_count
+        return min(max(index, 0), self.slices_count - 1)
+
+    def slice(self, index: int) -> np.ndarray:
+        """Return the (y, x, 2) currents of a slice, loading it if not in the window"""
+        index = self.slice_index(index)
+        if index in self.slices:
+            self.slices.move_to_end(index)
+            return self.slices[index]
+
+        self.slices[index] = self.loader(index)
+        self.loaded_slices += 1
+        if len(self.slices) > self.window:
+            self.slices.popitem(last=False)                                     # Drop the least recently used slice
+        return self.slices[index]
+
+    def interpolation(self, time: float) -> tuple[int, float]:
+        """Return the slice before a time and the weight of the slice after it"""
+        position = time / self.slice_interval
+        index = int(np.floor(position))
+        return index, position - index
+
+    def at(self, time: float) -> np.ndarray:
+        """Return the (y, x, 2) currents at a given time
+        time: in seconds
+        """
+        index, weight = self.interpolation(time)
+        if weight == 0:
+            return self.slice(index)
+        return (1-weight) * self.slice(index) + weight * self.slice(index+1)
+
+    def sample(self, positions: np.ndarray, method: str = "nearest", time: float = None) -> tuple[np.ndarray, np.ndarray]:
+        """Return the currents at the given positions and time, see CurrentMap.sample
+        time: in seconds, the current time if None (optional)
+        """
+        index, weight = self.interpolation(self.time if time is None else time)
+        before = self.slice(index)
+        currents, inside = interpolate_currents(lambda iy, ix: before[iy, ix, :], self.shape, positions, method)
+        if weight != 0:
+            after = self.slice(index+1)
+            currents = (1-weight) * currents + weight * interpolate_currents(lambda iy, ix: after[iy, ix, :], self.shape, positions, method)[0]
+        return currents, inside
+
+    def advance(self, dt: float):
+        """Advance the current time
+        dt: in seconds
+        """
+        self.time += dt
+
+    def __getitem__(self, key: tuple):
+        """Index the currents at the current time like a dense (y, x, 2) currents map"""
+        index, weight = self.interpolation(self.time)
+        if weight == 0:
+            return self.slice(index)[key]
+        return (1-weight) * self.slice(index)[key] + weight * self.slice(index+1)[key]
@@ -0,0 +1,144 @@
+"""Tiled currents module, for maps too large to be held in memory"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from modules.currents import propagate_random_currents, interpolate_currents
+
+class TiledCurrentMap:
+    """Tiled currents map class
+
+    The map is split in fixed-size tiles, generated (or loaded) on first access
+    and kept in a least recently used cache, so a boat crossing the map only
+    touches the tiles along its path.
+
+    Generated tiles follow the random currents model. Each tile grows from the
+    seam lines below and left of it, and blends into the seam lines above and
+    right of it, which are also the seeds of its neighbours: tiles join without
+    discontinuity while only depending on the seed and on their own position.
+    """
+    def __init__(self, size: tuple, max_speed: float, dispersion: float = .3, tile_size: int = 256, max_tiles: int = 64, seed: int = None, blend: int = 16, loader: callable = None):
+        """Initialize the tiled map, no tile is generated yet
+        size: (x, y) in meters
+        max_speed: in m/s, speeds are bounded by max_speed
+        dispersion: in [0, 1]
+        tile_size: tiles side in meters
+        max_tiles: number of tiles kept in memory
+        seed: random seed, drawn once if None (optional)
+        blend: number of cells over which a tile blends into its top and right seams
+        loader: function returning the (y, x, 2) normalized currents of tile (tile_x, tile_y), instead of generating it (optional)
+        """
+        self.size = size
+        self.max_speed = max_speed
+        self.dispersion = dispersion
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.blend = blend
+        self.loader = loader
+        self.tiles = OrderedDict()
+        self.touched_tiles = set()
+        self.tiles_count = (-(-size[0] // tile_size), -(-size[1] // tile_size))
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the equivalent dense currents map"""
+        return (self.size[1], self.size[0], 2)
+
+    def tile(self, tile_x: int, tile_y: int) -> np.ndarray:
+        """Return the (y, x, 2) currents of a tile, generating or loading it on first access"""
+        key = (tile_x, tile_y)
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+            return self.tiles[key]
+
+        if self.loader is None:
+            currents = self.generate_tile(tile_x, tile_y)
+        else:
+            currents = self.loader(tile_x, tile_y)
+
+        self.tiles[key] = currents
+        self.touched_tiles.add(key)
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)                                      # Evict the least recently used tile
+        return currents
+
+    def tile_shape(self, tile_x: int, tile_y: int) -> tuple[int, int]:
+        """Return the (y, x) shape of a tile, smaller on the top and right edges of the map"""
+        return (min(self.tile_size, self.size[1] - tile_y*self.tile_size),
+                min(self.tile_size, self.size[0] - tile_x*self.tile_size))
+
+    # ------------------------------ Generation ------------------------------ #
+
+    def corner(self, tile_x: int, tile_y: int) -> float:
+        """Return the currents seeding the bottom-left corner of a tile"""
+        dispermin, dispermax = 1 - self.dispersion, 1 + self.dispersion
+        return np.random.default_rng([self.seed, 0, tile_x, tile_y]).uniform(dispermin, dispermax)
+
+    def seam(self, tile_x: int, tile_y: int, vertical: bool) -> np.ndarray:
+        """Return the seam line below (or left of) a tile, from its corner to the next one
+        vertical: left seam if True, bottom seam otherwise
+        """
+        dispermin, dispermax = 1 - self.dispersion, 1 + self.dispersion
+        length = self.tile_shape(tile_x, tile_y)[0 if vertical else 1]
+        rng = np.random.default_rng([self.seed, 1 + vertical, tile_x, tile_y])
+        start = np.log(self.corner(tile_x, tile_y))
+        end = np.log(self.corner(tile_x, tile_y+1) if vertical else self.corner(tile_x+1, tile_y))
+
+        steps = np.log(np.mean(rng.uniform(dispermin, dispermax, (length, 6)), axis=1))  # Same dispersion as an averaged cell
+        walk = start + np.concatenate([[0], np.cumsum(steps)])
+        walk += np.linspace(0, 1, length+1) * (end - walk[-1])                  # Bridge the walk to the next corner
+        return np.exp(walk)
+
+    def generate_tile(self, tile_x: int, tile_y: int) -> np.ndarray:
+        """Generate the (y, x, 2) normalized currents of a tile"""
+        dispermin, dispermax = 1 - self.dispersion, 1 + self.dispersion
+        height, width = self.tile_shape(tile_x, tile_y)
+        rng = np.random.default_rng([self.seed, 3, tile_x, tile_y])
+
+        currents = np.zeros((height+1, width+1, 2))
+        currents[0,:,:] = self.seam(tile_x, tile_y, False)[:, None]            # Bottom seam, shared with the tile below
+        currents[:,0,:] = self.seam(tile_x, tile_y, True)[:, None]             # Left seam, shared with the tile on the left
+        propagate_random_currents(currents, rng.uniform(dispermin, dispermax, (height, width, 3, 2)))
+        currents = currents[1:,1:,:]
+
+        if tile_y + 1 < self.tiles_count[1]:                                    # Blend into the top seam
+            blend = min(self.blend, height)
+            weights = np.arange(1, blend+1)[:, None, None] / blend
+            top = self.seam(tile_x, tile_y+1, False)[1:, None]
+            currents[height-blend:,:,:] += weights * (top - currents[-1,:,:])
+        if tile_x + 1 < self.tiles_count[0]:                                    # Blend into the right seam
+            blend = min(self.blend, width)
+            weights = np.arange(1, blend+1)[None, :, None] / blend
+            right = self.seam(tile_x+1, tile_y, True)[1:, None]
+            currents[:,width-blend:,:] += weights * (right - currents[:,-1,:])[:, None, :]
+
+        currents *= self.max_speed / (np.sqrt(2) * dispermax)                   # Fixed scale, a lazy map has no global maximum
+        speeds = np.sqrt(currents[:,:,0]**2 + currents[:,:,1]**2)
+        return currents * np.minimum(1, self.max_speed / np.maximum(speeds, 1e-12))[:, :, None]
+
+    # ------------------------------- Sampling ------------------------------- #
+
+    def lookup(self, iy: np.ndarray, ix: np.ndarray) -> np.ndarray:
+        """Return the (N, 2) currents of the (N,) cells indexes (iy, ix), tile by tile"""
+        iy, ix = np.asarray(iy), np.asarray(ix)
+        currents = np.zeros(iy.shape + (2,))
+        tile_y, tile_x = iy // self.tile_size, ix // self.tile_size
+        keys = tile_y * self.tiles_count[0] + tile_x
+        for key in np.unique(keys):
+            in_tile = keys == key
+            ty, tx = divmod(int(key), self.tiles_count[0])
+            currents[in_tile] = self.tile(tx, ty)[iy[in_tile] - ty*self.tile_size,
+                                                  ix[in_tile] - tx*self.tile_size, :]
+        return currents
+
+    def sample(self, positions: np.ndarray, method: str = "nearest", time: float = 0) -> tuple[np.ndarray, np.ndarray]:
+        """Return the currents at the given positions, see CurrentMap.sample"""
+        return interpolate_currents(self.lookup, self.shape, positions, method)
+
+    def __getitem__(self, key: tuple):
+        """Index the map like a dense (y, x, 2) currents map, with integer cell indexes"""
+        iy, ix, *rest = key
+        tile_y, tile_x = iy // self.tile_size, ix // self.tile_size
+        return self.tile(tile_x, tile_y)[(iy - tile_y*self.tile_size, ix - tile_x*self.tile_size, *rest)]
@@ -0,0 +1,117 @@
+"""Watchdog module: step and wall-clock budgets, and stall detection of the steering loops"""
+
+import time
+
+import numpy as np
+
+# ----------------------------- Termination reasons ---------------------------- #
+ARRIVED = "arrived"
+OUT_OF_BOUNDS = "out_of_bounds"
+STALLED = "stalled"
+BUDGET = "budget"
+
+class Watchdog:
+    """Watchdog class
+
+    Ends the runs of one or many boats: when a boat has used its step budget,
+    when the whole run has used its wall-clock budget, or when a boat has not
+    progressed over a window of steps. Progress is the decrease of the distance
+    to the goal or, for boats without a goal, the distance moved. Steering
+    models going away from the goal for a while, like route following, need a
+    window longer than their detours.
+    """
+    def __init__(self, max_steps: int = None, max_duration: float = None, window: int = None, progress: float = 0):
+        """max_steps: step budget of each boat (optional)
+        max_duration: wall-clock budget of the run in seconds (optional)
+        window: number of steps over which progress is measured, no stall detection if None (optional)
+        progress: minimum progress over a window in meters (optional)
+        """
+        self.max_steps = max_steps
+        self.max_duration = max_duration
+        self.window = window
+        self.progress = progress
+        self.reset(np.zeros((1, 2)))
+
+    def reset(self, positions: np.ndarray, goals: np.ndarray = None):
+        """Start watching a run
+        positions: (N, 2) or (2,) starting positions (x, y) in meters
+        goals: (N, 2) or (2,) goal positions (x, y) in meters, distance moved is watched if None (optional)
+        """
+        positions = np.array(positions, dtype=float).reshape(-1, 2)
+        self.goals = None if goals is None else np.broadcast_to(np.asarray(goals, dtype=float), positions.shape).copy()
+        self.steps = np.zeros(len(positions), dtype=int)
+        self.references = self.measure(np.arange(len(positions)), positions)
+        self.start_time = time.perf_counter()
+
+    def measure(self, boats: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Return the quantity whose variation is the boats' progress"""
+        if self.goals is None:
+            return positions.copy()
+        return np.sqrt(np.sum((positions - self.goals[boats])**2, axis=-1))
+
+    def check(self, boats: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Count a step of some boats and return why each of them must stop, None if it must not
+        boats: (n,) rows of the boats
+        positions: (n, 2) positions (x, y) in meters after the step
+        """
+        boats = np.asarray(boats).reshape(-1)
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.steps[boats] += 1
+        reasons = np.full(len(boats), None, dtype=object)
+
+        if self.window is not None:
+            due = self.steps[boats] % self.window == 0
+            if np.any(due):
+                measure = self.measure(boats[due], positions[due])
+                if self.goals is None:
+                    progressed = np.sqrt(np.sum((measure - self.references[boats[due]])**2, axis=1))
+                else:
+                    progressed = self.references[boats[due]] - measure
+                self.references[boats[due]] = measure
+                stalled = np.zeros(len(boats), dtype=bool)
+                stalled[due] = progressed <= self.progress
+                reasons[stalled] = STALLED
+
+        if self.max_steps is not None:
+            reasons[self.steps[boats] >= self.max_steps] = BUDGET
+        if self.max_duration is not None and time.perf_counter() - self.start_time > self.max_duration:
+            reasons[:] = BUDGET
+        return reasons
+
+    def stop(self, position: np.ndarray) -> str:
+        """Count a step of a single boat and return why it must stop, None if it must not
+        position: (x, y) in meters after the step
+        """
+        steps = self.steps[0] = self.steps[0] + 1
+        if self.window is not None and steps % self.window == 0:                # Rare: the vectorized check, without counting the step again
+            self.steps[0] -= 1
+            return self.check(np.zeros(1, dtype=int), position)[0]
+        if self.max_steps is not None and steps >= self.max_steps:
+            return BUDGET
+        if self.max_duration is not None and time.perf_counter() - self.start_time > self.max_duration:
+            return BUDGET
+        return None
+
+    def chunk(self, steps: int = 4096) -> int:
+        """Return how many steps a single boat can take before the watchdog must be consulted
+        steps: largest chunk (optional)
+        """
+        if self.window is not None:
+            steps = min(steps, self.window - self.steps[0] % self.window)
+        if self.max_steps is not None:
+            steps = min(steps, max(self.max_steps - self.steps[0], 1))
+        return int(steps)
+
+    def count(self, steps: int):
+        """Count steps of a single boat ending before the watchdog must be consulted, see chunk
+        steps: number of steps
+        """
+        self.steps[0] += steps
+
+    def advance(self, steps: int, position: np.ndarray) -> str:
+        """Count a chunk of steps of a single boat, see chunk, and return why it must stop, None if it must not
+        steps: number of steps
+        position: (x, y) in meters after the last step
+        """
+        self.steps[0] += steps - 1
+        return self.stop(position)
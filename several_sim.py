@@ -16,6 +16,8 @@ from modules.currents import CurrentMap
 from modules.boats import Boat
 from modules.routes import Route
 from modules.score import create_score_matrix
+from modules.watchdog import Watchdog
+import modules.jit as jit
 from modules import models
 
 import MRLib as mrl
@@ -26,6 +28,7 @@ import MRLib as mrl
 # ---------------------------------------------------------------------------- #
 
 loops = 100
+currents_chunk_size = 20                                                       # Currents maps generated at once
 
 # ----------------------------------- Map ------------------------------------ #
 
@@ -42,11 +45,15 @@ end = (155, 45)                                                                #
 # -------------------------------- Currents ---------------------------------- #
 
 currents_max_speed = 2
-currents_dispersion = .3
+currents_dispersion = .3                                                       # Correlation length in meters for spectral currents
 
-currents_models = ["No currents", "Uniform currents", "Random currents"]
+currents_models = ["No currents", "Uniform currents", "Random currents",
+                   "Spectral currents", "Divergence-free spectral currents"]
 # currents_model = mrl.display.menu(currents_models, "Currents model")[0]-1
 currents_model = 2
+currents_dtype = np.float32                                                    # Half the memory of float64
+
+backend = "auto"                                                               # "numpy", "jit" or "auto": compiled kernels when Numba is installed
 
 # ----------------------------- Boats parameters ----------------------------- #
 
@@ -56,6 +63,12 @@ precision = .25 # m
 
 hydrodynamic_efficiency = 1
 
+max_steps = 20000                                                              # Step budget of each boat
+max_duration = 10 # s                                                          # Wall-clock budget of each boat
+stall_window = 500                                                             # Steps over which a boat must progress
+stall_progress = 1 # m                                                         # Minimum progress over a window
+record_trajectories = False                                                    # Boats only accumulate their metrics: constant memory
+
 # ----------------------------- Prints parameters ---------------------------- #
 
 print("---- Parameters: ----")
@@ -67,6 +80,7 @@ print(f"🔀 Currents dispersion: {currents_dispersion}")
 print(f"⛵ Boats base speed: {boats_base_speed} m/s")
 print(f"🚤 Hydrodynamic efficiency: {hydrodynamic_efficiency}")
 print(f"🕐 Calculations tick: {calculations_tick}s")
+print(f"⚙️  Backend: {'jit' if jit.use_jit(backend) else 'numpy'}")
 print(f"🧭 Initial heading: {90 - (mrl.geometry.direction(start, end) / np.pi * 180):.2f}°")
 
 # ---------------------------------- Routes ---------------------------------- #
@@ -86,35 +100,47 @@ for r in routes:
 # ---------------------------------- Boats ----------------------------------- #
 
 inertBoat = Boat("Bateau inerte", start,
-                 boats_base_speed, hydrodynamic_efficiency, calculations_tick=calculations_tick)
+                 boats_base_speed, hydrodynamic_efficiency, calculations_tick=calculations_tick,
+                 watchdog=Watchdog(max_steps, max_duration, stall_window, stall_progress), backend=backend,
+                 record=record_trajectories)
 
 initialHeadedBoat = Boat("Maintien de cap", start,
                          boats_base_speed, hydrodynamic_efficiency,
                          models.directionKeeping, precision=precision, color='#CC2D2D',
                          modelParams={'model': models.directionKeeping},
-                         calculations_tick=calculations_tick)
+                         calculations_tick=calculations_tick,
+                         watchdog=Watchdog(max_steps, max_duration, stall_window, stall_progress), backend=backend,
+                         record=record_trajectories)
 
 GPSheadedBoat = Boat("Guidage GPS", start,
                      boats_base_speed, hydrodynamic_efficiency,
                      models.controlledPositionPICorrector, precision=precision, color='#88BE1B',
-                     calculations_tick=calculations_tick)
+                     calculations_tick=calculations_tick,
+                     watchdog=Watchdog(max_steps, max_duration, stall_window, stall_progress), backend=backend,
+                     record=record_trajectories)
 
 driftCorrectionBoat = Boat("Correction de la dérive", start,
                            boats_base_speed, hydrodynamic_efficiency,
                            models.driftCorrection, precision=precision, color='#941BBE',
-                           calculations_tick=calculations_tick)
+                           calculations_tick=calculations_tick,
+                           watchdog=Watchdog(max_steps, max_duration, stall_window, stall_progress), backend=backend,
+                           record=record_trajectories)
 
 currentsAdaptedBoatPI = Boat("Suivi de la route adaptée", start,
                             boats_base_speed, hydrodynamic_efficiency,
                             models.routeFollowing, precision=precision, color='#72FF70',
                             modelParams={'route': adaptedRoute, 'model': models.controlledPositionPICorrector},
-                            calculations_tick=calculations_tick)
+                            calculations_tick=calculations_tick,
+                            watchdog=Watchdog(max_steps, max_duration, stall_window, stall_progress), backend=backend,
+                            record=record_trajectories)
 
 directRouteBoat = Boat("Suivi de la ligne directe", start,
                           boats_base_speed, hydrodynamic_efficiency,
                           models.routeFollowing, precision=precision, color='#BE1B88',
                           modelParams={'route': directRoute, 'model': models.controlledPositionPICorrector},
-                          calculations_tick=calculations_tick)
+                          calculations_tick=calculations_tick,
+                          watchdog=Watchdog(max_steps, max_duration, stall_window, stall_progress), backend=backend,
+                          record=record_trajectories)
 
 
 boats = [inertBoat, initialHeadedBoat, GPSheadedBoat, currentsAdaptedBoatPI, directRouteBoat]
@@ -136,20 +162,11 @@ datas= {
     "datas": []
 }
 
-def calculate_step(k):
+def calculate_step(k, currents_map, currents_speeds):
     datas['datas'].append({})
 
     step_time = time.perf_counter()
 
-    # ------------------------------- Currents ------------------------------- #
-
-    currents = CurrentMap(size, currents_model, currents_max_speed,
-                        currents_dispersion)
-    currents_map = currents.get_currents()
-    currents_speeds = currents.speeds
-
-    # print(f"  🌊 Currents calculated in {time.perf_counter()-step_time:.2f}s")
-
     # -------------------------------- Routes -------------------------------- #
 
     for r in routes:
@@ -166,16 +183,7 @@ def calculate_step(k):
         b.calculate(currents_map, end)
         b.calculations_duration = time.perf_counter()-model_time
 
-        datas['datas'][k][b.name] = {
-            # 'speed': list(b.speeds),
-            'max_speed': np.max(b.speeds),
-            # 'direction': list(b.directions),
-            'direction_changes': np.sum(np.abs(np.diff(b.directions)))*180/np.pi,
-            # 'power': list(b.powers),
-            'total_negative_work': np.sum([p for p in b.powers if p<0]),
-            # 'currents_speed': list(currents_speeds[b.positions[:,1].astype(int), b.positions[:,0].astype(int)]),
-            'time_of_arrival': len(b.positions)*calculations_tick,
-        }
+        datas['datas'][k][b.name] = b.metrics()
 
     # print(f"  🚤 Boats calculated in {time.perf_counter()-step_time:.2f}s")
 
@@ -187,8 +195,13 @@ def calculate_step(k):
     print(f"✔ Step {k+1} calculated in {time.perf_counter()-step_time:.2f}s")
 
 # Start all threads
-for k in range(loops):
-    calculate_step(k)
+k = 0
+for currents_maps, currents_speeds in CurrentMap.generate_batches(size, currents_model, currents_max_speed,
+                                                                  currents_dispersion, loops, currents_chunk_size,
+                                                                  dtype=currents_dtype, backend=backend):
+    for currents_map, speeds in zip(currents_maps, currents_speeds):
+        calculate_step(k, currents_map, speeds)
+        k += 1
 
 
 # ---------------------------------------------------------------------------- #
@@ -238,6 +251,11 @@ for k in range(len(datas['datas'])):
 
 print(f"File parsed in {time.perf_counter()-step_time:.2f}s")
 
+print("----- 🛑 Terminations -----")
+for boat in datas['datas'][0]:
+    reasons = [datas['datas'][k][boat]['termination'] for k in range(len(datas['datas']))]
+    print(f"- {boat}: " + ", ".join(f"{r} {reasons.count(r)}" for r in sorted(set(reasons), key=str)))
+
 # ---------------------------------------------------------------------------- #
 #                           Plot average models stats                          #
 # ---------------------------------------------------------------------------- #